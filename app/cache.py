@@ -0,0 +1,152 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def make_key(*parts) -> str:
+    """
+    Genera una clave estable (sha256) a partir de varias partes (str o bytes).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Caché persistente clave -> bytes sobre SQLite, con expulsión LRU por tamaño y antigüedad.
+
+    Args:
+        path: Archivo SQLite donde se guardan las entradas.
+        max_bytes: Tamaño máximo total de los valores; se expulsan primero los menos usados.
+        max_age: Segundos que vive una entrada desde que se creó (None = sin límite).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 200 * 1024 * 1024, max_age: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # La conexión se abre la primera vez que se usa la caché
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Devuelve las entradas encontradas (las que faltan no aparecen en el dict).
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value, created_at FROM entries WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.max_age is None or now - created_at <= self.max_age:
+                        found[key] = value
+                if found:
+                    hit_keys = [k for k in chunk if k in found]
+                    if hit_keys:
+                        conn.execute(
+                            f"UPDATE entries SET accessed_at = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                            [now, *hit_keys],
+                        )
+            conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes):
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        now = time.time()
+        rows = [(key, value, len(value), now, now) for key, value in items]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        # Primero las caducadas, luego las menos usadas hasta quedar por debajo del tamaño máximo
+        if self.max_age is not None:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        to_delete = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            to_delete.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Devuelve aciertos, fallos, tasa de acierto, número de entradas y bytes ocupados.
+        """
+        with self._lock:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
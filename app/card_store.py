@@ -0,0 +1,390 @@
+import importlib
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from word_index import fold
+
+CARD_FIELDS = ("id", "palabra", "traduccion", "ejemplo_fr", "created_at")
+# Cambios que se conservan en el registro; quien se quede más atrás vuelve a leer el mazo entero
+CHANGE_LOG_SIZE = int(os.getenv("FLASHCARDS_CHANGE_LOG_SIZE", "100000"))
+
+
+class CardStore(ABC):
+    """
+    Almacén de los datos de cada flashcard (palabra, traducción, ejemplo y fecha), separado del
+    almacén vectorial.
+
+    Listar, buscar, contar y borrar se resuelven aquí; Chroma solo guarda los embeddings para
+    las consultas de similitud. Las flashcards se agrupan por mazo (`deck`, "" es el mazo por
+    defecto) y sus ids son únicos entre mazos.
+
+    Cada mazo tiene una versión que crece con cada alta, edición o borrado, hecha desde este
+    proceso o desde otro; con `changes` quien guarda una copia en memoria (el índice de palabras,
+    la página de Manage) sabe qué flashcards cambiaron sin volver a leer el mazo.
+
+    Para usar otro backend basta con heredar de esta clase e indicarlo en FLASHCARDS_CARD_STORE
+    ("paquete.modulo:Clase"); el constructor recibe la ruta de la base de datos. Si falta algún
+    método abstracto, la clase falla al crearse y no en la primera lectura.
+    """
+
+    @abstractmethod
+    def add(self, cards: Iterable[dict], deck: str = ""):
+        """
+        Guarda flashcards nuevas (dicts con CARD_FIELDS); los ids que ya existen no se tocan.
+        """
+
+    @abstractmethod
+    def update(self, cards: Iterable[dict], deck: str = ""):
+        """
+        Cambia la traducción y el ejemplo de flashcards existentes (por id).
+        """
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str], deck: str = "") -> int:
+        """
+        Borra flashcards por id y devuelve cuántas existían.
+        """
+
+    @abstractmethod
+    def get(self, ids: Iterable[str], deck: str = "") -> Dict[str, dict]:
+        """
+        Devuelve {id: flashcard} con las que existen.
+        """
+
+    @abstractmethod
+    def count(self, deck: str = "", prefix: Optional[str] = None, contains: Optional[str] = None) -> int:
+        """
+        Cuántas flashcards del mazo cumplen el filtro (el mismo que en `page`).
+        """
+
+    @abstractmethod
+    def page(self, deck: str = "", limit: int = 50, offset: int = 0, prefix: Optional[str] = None,
+             contains: Optional[str] = None) -> List[dict]:
+        """
+        Flashcards del mazo en orden de creación. `prefix` filtra por el comienzo de la palabra y
+        `contains` por un texto dentro de la palabra o la traducción (sin acentos ni mayúsculas).
+        """
+
+    @abstractmethod
+    def ids(self, deck: str = "", prefix: Optional[str] = None, contains: Optional[str] = None) -> List[str]:
+        """
+        Ids de las flashcards del mazo que cumplen el filtro, en orden de creación.
+        """
+
+    @abstractmethod
+    def iter(self, deck: str = "", batch_size: int = 1000) -> Iterator[dict]:
+        """
+        Recorre el mazo entero por lotes, sin cargarlo en memoria.
+        """
+
+    @abstractmethod
+    def version(self, deck: str = "") -> int:
+        """
+        Versión actual del mazo (0 si nunca se escribió en él).
+        """
+
+    @abstractmethod
+    def changes(self, since: int, deck: str = "") -> Optional[dict]:
+        """
+        Cambios del mazo posteriores a la versión `since`.
+
+        Returns:
+            Dict con version (la actual), upserted (flashcards agregadas o editadas, con
+            CARD_FIELDS) y deleted (ids borrados), o None si el registro ya no llega tan atrás y
+            hay que volver a leer el mazo
+        """
+
+    @abstractmethod
+    def get_meta(self, key: str) -> Optional[str]:
+        """
+        Valor de una marca propia del almacén (por ejemplo, la de la copia desde Chroma) o None.
+        """
+
+    @abstractmethod
+    def set_meta(self, key: str, value: str):
+        """
+        Guarda una marca propia del almacén.
+        """
+
+    def close(self):
+        pass
+
+
+class SQLiteCardStore(CardStore):
+    """
+    CardStore sobre SQLite: una fila por flashcard con índices por (mazo, orden de creación) y
+    (mazo, palabra), y un índice FTS5 de trigramas para buscar texto dentro de palabras y
+    traducciones. Todas las lecturas son consultas indexadas; ninguna necesita embeddings.
+
+    Si el SQLite instalado no trae FTS5, "contiene" recorre las filas del mazo con instr().
+
+    Cada escritura anota los ids que toca en un registro de cambios (changes) y la nueva versión
+    del mazo (deck_versions) en su misma transacción, así que ninguna queda sin versión. El
+    registro se recorta a CHANGE_LOG_SIZE entradas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fts = False
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # word_key y translation_key son palabra y traducción pasadas por fold(); seq da el orden de
+            # creación y es la clave del índice FTS (un rowid implícito podría cambiar con VACUUM)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cards ("
+                "seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, deck TEXT NOT NULL, "
+                "palabra TEXT NOT NULL, traduccion TEXT NOT NULL, ejemplo_fr TEXT NOT NULL DEFAULT '', created_at TEXT, "
+                "word_key TEXT NOT NULL, translation_key TEXT NOT NULL)"
+            )
+            # Un índice por deck devuelve sus filas en orden de seq (creación)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck ON cards(deck)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_word ON cards(deck, word_key)")
+            # Marcas propias del card_store. La tabla "meta" de la misma base es del planificador de repasos;
+            # las marcas que se guardaron allí antes de separarlas se mueven una vez
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.execute("CREATE TABLE IF NOT EXISTS card_meta (key TEXT PRIMARY KEY, value TEXT)")
+            if "meta" in tables and "card_meta" not in tables:
+                moved = "key LIKE 'cards\\_migrated:%' ESCAPE '\\' OR key = 'changes_trimmed_through'"
+                conn.execute(f"INSERT OR IGNORE INTO card_meta SELECT key, value FROM meta WHERE {moved}")
+                conn.execute(f"DELETE FROM meta WHERE {moved}")
+            # AUTOINCREMENT: una versión no se reutiliza aunque se recorte el registro
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT, deck TEXT NOT NULL, id TEXT NOT NULL, deleted INTEGER NOT NULL);
+                CREATE INDEX IF NOT EXISTS idx_changes_deck ON changes(deck, version);
+                CREATE TABLE IF NOT EXISTS deck_versions (deck TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            """)
+            try:
+                # Índice externo: solo guarda los trigramas, el texto sigue en cards
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5("
+                    "word_key, translation_key, content='cards', content_rowid='seq', tokenize='trigram')"
+                )
+                conn.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+                        INSERT INTO cards_fts(rowid, word_key, translation_key)
+                        VALUES (new.seq, new.word_key, new.translation_key);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+                        INSERT INTO cards_fts(cards_fts, rowid, word_key, translation_key)
+                        VALUES ('delete', old.seq, old.word_key, old.translation_key);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF word_key, translation_key ON cards BEGIN
+                        INSERT INTO cards_fts(cards_fts, rowid, word_key, translation_key)
+                        VALUES ('delete', old.seq, old.word_key, old.translation_key);
+                        INSERT INTO cards_fts(rowid, word_key, translation_key)
+                        VALUES (new.seq, new.word_key, new.translation_key);
+                    END;
+                """)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ FTS5 no disponible ({e}): la búsqueda por texto recorrerá el mazo")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _filter(self, deck: str, prefix: Optional[str], contains: Optional[str]) -> tuple:
+        # Devuelve (WHERE, parámetros) para las consultas sobre cards; se llama con la conexión abierta
+        clauses, params = ["deck = ?"], [deck]
+        prefix = fold(prefix or "")
+        if prefix:
+            clauses.append("word_key >= ? AND word_key < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        contains = fold(contains or "")
+        if contains:
+            # Los trigramas necesitan al menos 3 caracteres
+            if self.fts and len(contains) >= 3:
+                clauses.append("seq IN (SELECT rowid FROM cards_fts WHERE cards_fts MATCH ?)")
+                params.append('"' + contains.replace('"', '""') + '"')
+            else:
+                clauses.append("(instr(word_key, ?) > 0 OR instr(translation_key, ?) > 0)")
+                params += [contains, contains]
+        return " AND ".join(clauses), params
+
+    def _log(self, conn: sqlite3.Connection, deck: str, ids: List[str], deleted: bool):
+        # Se llama con el lock tomado, dentro de la transacción de la escritura
+        if not ids:
+            return
+        conn.executemany("INSERT INTO changes (deck, id, deleted) VALUES (?, ?, ?)", [(deck, u_id, deleted) for u_id in ids])
+        last = conn.execute("SELECT MAX(version) FROM changes").fetchone()[0]
+        conn.execute(
+            "INSERT INTO deck_versions VALUES (?, ?) ON CONFLICT (deck) DO UPDATE SET version = excluded.version", (deck, last)
+        )
+        if last > CHANGE_LOG_SIZE:
+            trimmed = conn.execute("DELETE FROM changes WHERE version <= ?", (last - CHANGE_LOG_SIZE,)).rowcount
+            if trimmed:
+                conn.execute("INSERT OR REPLACE INTO card_meta VALUES ('changes_trimmed_through', ?)", (str(last - CHANGE_LOG_SIZE),))
+
+    def add(self, cards: Iterable[dict], deck: str = ""):
+        rows = [
+            (card["id"], deck, card["palabra"], card["traduccion"], card.get("ejemplo_fr") or "",
+             card.get("created_at"), fold(card["palabra"]), fold(card["traduccion"]))
+            for card in cards
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO cards (id, deck, palabra, traduccion, ejemplo_fr, created_at, word_key, translation_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._log(conn, deck, [row[0] for row in rows], deleted=False)
+            conn.commit()
+
+    def update(self, cards: Iterable[dict], deck: str = ""):
+        rows = [
+            (card["traduccion"], card.get("ejemplo_fr") or "", fold(card["traduccion"]), card["id"], deck)
+            for card in cards
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "UPDATE cards SET traduccion = ?, ejemplo_fr = ?, translation_key = ? WHERE id = ? AND deck = ?", rows
+            )
+            self._log(conn, deck, [row[3] for row in rows], deleted=False)
+            conn.commit()
+
+    def delete(self, ids: Iterable[str], deck: str = "") -> int:
+        with self._lock:
+            conn = self._connect()
+            # rowcount suma las filas borradas sin contar las que tocan los triggers del índice FTS
+            ids = list(ids)
+            deleted = conn.executemany("DELETE FROM cards WHERE id = ? AND deck = ?", [(u_id, deck) for u_id in ids]).rowcount
+            if deleted > 0:
+                self._log(conn, deck, ids, deleted=True)
+            conn.commit()
+            return max(deleted, 0)
+
+    def get(self, ids: Iterable[str], deck: str = "") -> Dict[str, dict]:
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                # Solo por id: con "deck = ?" en el WHERE, SQLite prefiere recorrer el mazo por idx_cards_deck
+                rows = conn.execute(
+                    f"SELECT deck, {', '.join(CARD_FIELDS)} FROM cards WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((row[1], dict(zip(CARD_FIELDS, row[1:]))) for row in rows if row[0] == deck)
+        return found
+
+    def count(self, deck: str = "", prefix: Optional[str] = None, contains: Optional[str] = None) -> int:
+        with self._lock:
+            conn = self._connect()
+            where, params = self._filter(deck, prefix, contains)
+            return conn.execute(f"SELECT COUNT(*) FROM cards WHERE {where}", params).fetchone()[0]
+
+    def page(self, deck: str = "", limit: int = 50, offset: int = 0, prefix: Optional[str] = None,
+             contains: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            conn = self._connect()
+            where, params = self._filter(deck, prefix, contains)
+            rows = conn.execute(
+                f"SELECT {', '.join(CARD_FIELDS)} FROM cards WHERE {where} ORDER BY seq LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return [dict(zip(CARD_FIELDS, row)) for row in rows]
+
+    def ids(self, deck: str = "", prefix: Optional[str] = None, contains: Optional[str] = None) -> List[str]:
+        with self._lock:
+            conn = self._connect()
+            where, params = self._filter(deck, prefix, contains)
+            rows = conn.execute(f"SELECT id FROM cards WHERE {where} ORDER BY seq", params).fetchall()
+        return [row[0] for row in rows]
+
+    def iter(self, deck: str = "", batch_size: int = 1000) -> Iterator[dict]:
+        # Paginación por seq: cada lote es una búsqueda en el índice, no un OFFSET que crece
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    f"SELECT seq, {', '.join(CARD_FIELDS)} FROM cards WHERE deck = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (deck, last, batch_size),
+                ).fetchall()
+            for row in rows:
+                yield dict(zip(CARD_FIELDS, row[1:]))
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+
+    def version(self, deck: str = "") -> int:
+        with self._lock:
+            row = self._connect().execute("SELECT version FROM deck_versions WHERE deck = ?", (deck,)).fetchone()
+        return row[0] if row else 0
+
+    def changes(self, since: int, deck: str = "") -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            # Una sola transacción de lectura: versión y cambios tienen que ser coherentes entre sí
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute("SELECT version FROM deck_versions WHERE deck = ?", (deck,)).fetchone()
+                version = row[0] if row else 0
+                trimmed = conn.execute("SELECT value FROM card_meta WHERE key = 'changes_trimmed_through'").fetchone()
+                if trimmed and since < int(trimmed[0]):
+                    return None
+                # El último cambio de cada id es el que cuenta
+                latest = dict(conn.execute(
+                    "SELECT id, deleted FROM changes WHERE deck = ? AND version > ? AND version <= ? ORDER BY version",
+                    (deck, since, version),
+                ).fetchall())
+                upserted = [u_id for u_id, deleted in latest.items() if not deleted]
+                cards = []
+                for start in range(0, len(upserted), 500):
+                    chunk = upserted[start:start + 500]
+                    # Por id, como en get(): los ids del registro ya son de este mazo
+                    cards += [
+                        dict(zip(CARD_FIELDS, row)) for row in conn.execute(
+                            f"SELECT {', '.join(CARD_FIELDS)} FROM cards WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                        )
+                    ]
+            finally:
+                conn.execute("COMMIT")
+        return {"version": version, "upserted": cards, "deleted": [u_id for u_id, deleted in latest.items() if deleted]}
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM card_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO card_meta VALUES (?, ?)", (key, value))
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+BACKENDS = {"sqlite": SQLiteCardStore}
+
+
+def open_card_store(backend: str, path: str) -> CardStore:
+    """
+    Crea el almacén de flashcards: un nombre de BACKENDS ("sqlite") o "paquete.modulo:Clase".
+    """
+    if backend in BACKENDS:
+        return BACKENDS[backend](path)
+    module, _, name = backend.partition(":")
+    if not name:
+        raise ValueError(f"Almacén de flashcards desconocido: {backend} (usa {', '.join(BACKENDS)} o 'modulo:Clase')")
+    cls = getattr(importlib.import_module(module), name)
+    if not (isinstance(cls, type) and issubclass(cls, CardStore)):
+        raise TypeError(f"{backend} no es una subclase de CardStore")
+    return cls(path)
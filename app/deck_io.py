@@ -0,0 +1,274 @@
+import argparse
+import csv
+import html
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from typing import IO, Iterator, Optional
+
+from functions import iter_flashcards, job_queue, normalize_namespace, save_flashcards_to_db, update_flashcards, NEAR_DUPLICATE_THRESHOLD
+from llm_scheduler import BULK, lane
+
+FORMATS = ("csv", "jsonl", "anki")
+# Filas por lote al importar (una escritura en Chroma por lote)
+IMPORT_BATCH_SIZE = int(os.getenv("FLASHCARDS_IMPORT_BATCH_SIZE", "1000"))
+# Errores de validación que se conservan como ejemplo (el resto solo se cuentan)
+MAX_ERROR_SAMPLES = 20
+MAX_FIELD_LENGTH = 500
+
+# Nombres de columna aceptados en CSV/JSONL para cada campo
+COLUMN_ALIASES = {
+    "palabra": ("palabra", "word", "french", "francés", "frances", "front"),
+    "traduccion": ("traduccion", "traducción", "translation", "spanish", "español", "espanol", "back"),
+    "ejemplo_fr": ("ejemplo_fr", "ejemplo", "example", "example_fr"),
+}
+ANKI_COLUMNS = ("Palabra", "Traducción", "Ejemplo")
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+
+def detect_format(filename: str) -> str:
+    """
+    Deduce el formato por la extensión: .csv, .jsonl/.ndjson o .txt/.tsv (Anki).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension in (".txt", ".tsv"):
+        return "anki"
+    raise ValueError(f"Formato no reconocido para '{filename}' (usa .csv, .jsonl o .txt)")
+
+
+def _pick(row: dict, field: str) -> str:
+    keys = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    for alias in COLUMN_ALIASES[field]:
+        value = keys.get(alias)
+        if value is not None:
+            return str(value)
+    return ""
+
+
+def _strip_html(text: str) -> str:
+    # Los mazos exportados por Anki suelen traer HTML en los campos
+    return html.unescape(_HTML_TAG.sub(" ", text.replace("<br>", " ")))
+
+
+def read_rows(file: IO[str], fmt: str) -> Iterator[tuple]:
+    """
+    Lee un mazo fila a fila, sin cargarlo entero.
+
+    Yields:
+        Tuplas (número de línea, dict con palabra/traduccion/ejemplo_fr o None, error o None)
+    """
+    if fmt == "csv":
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(file, dialect=dialect)
+        for row in reader:
+            yield reader.line_num, {field: _pick(row, field) for field in COLUMN_ALIASES}, None
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_num, None, f"JSON inválido: {e.msg}"
+                continue
+            if not isinstance(row, dict):
+                yield line_num, None, "Cada línea debe ser un objeto JSON"
+                continue
+            yield line_num, {field: _pick(row, field) for field in COLUMN_ALIASES}, None
+    elif fmt == "anki":
+        # Texto separado por tabuladores: palabra, traducción y (opcional) ejemplo; "#" son cabeceras
+        for line_num, line in enumerate(file, start=1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = [_strip_html(field) for field in line.split("\t")] + ["", "", ""]
+            yield line_num, {"palabra": fields[0], "traduccion": fields[1], "ejemplo_fr": fields[2]}, None
+    else:
+        raise ValueError(f"Formato desconocido: {fmt} (usa {', '.join(FORMATS)})")
+
+
+def validate_row(row: dict) -> Optional[str]:
+    """
+    Devuelve el motivo por el que una fila no es una flashcard válida, o None si lo es.
+    """
+    for field in ("palabra", "traduccion"):
+        if not row[field].strip():
+            return f"Falta el campo {field}"
+    for field, value in row.items():
+        if len(value) > MAX_FIELD_LENGTH:
+            return f"El campo {field} supera {MAX_FIELD_LENGTH} caracteres"
+    return None
+
+
+def import_deck(file: IO[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE, update_existing: bool = False,
+                near_duplicate_threshold: Optional[float] = NEAR_DUPLICATE_THRESHOLD, on_progress=None,
+                namespace: Optional[str] = None) -> dict:
+    """
+    Importa un mazo por lotes: valida cada fila y guarda `batch_size` flashcards por escritura.
+
+    Solo se mantiene en memoria un lote a la vez. Las palabras repetidas (en el archivo o ya
+    en el mazo) se omiten; con `update_existing` se actualizan su traducción y ejemplo.
+
+    Args:
+        file: Archivo de texto abierto.
+        fmt: "csv", "jsonl" o "anki".
+        batch_size: Flashcards por lote.
+        update_existing: Actualizar las flashcards que ya existen en lugar de omitirlas.
+        near_duplicate_threshold: Umbral de casi-duplicados; None desactiva la comprobación.
+        on_progress: Callback opcional on_progress(filas_leídas, agregadas).
+        namespace: Mazo de destino ("usuario/mazo"); None es el mazo por defecto.
+
+    Returns:
+        Dict con read, added, updated, duplicates, near_duplicates, invalid, errors (ejemplos) y seconds
+    """
+    t0 = time.perf_counter()
+    summary = {"read": 0, "added": 0, "updated": 0, "duplicates": 0, "near_duplicates": 0, "invalid": 0, "errors": []}
+    batch = []
+
+    def flush():
+        result = save_flashcards_to_db({"flashcards": batch}, near_duplicate_threshold=near_duplicate_threshold,
+                                       namespace=namespace)
+        summary["added"] += result["added"]
+        summary["near_duplicates"] += len(result["near_duplicates"])
+        if update_existing and result["duplicates"]:
+            duplicates = set(result["duplicates"])
+            summary["updated"] += update_flashcards([card for card in batch if card["palabra"] in duplicates], namespace)
+        summary["duplicates"] += len(result["duplicates"])
+        batch.clear()
+        if on_progress is not None:
+            on_progress(summary["read"], summary["added"])
+
+    for line_num, row, error in read_rows(file, fmt):
+        summary["read"] += 1
+        if row is not None:
+            row = {field: value.strip() for field, value in row.items()}
+            error = validate_row(row)
+        if error:
+            summary["invalid"] += 1
+            if len(summary["errors"]) < MAX_ERROR_SAMPLES:
+                summary["errors"].append({"line": line_num, "error": error})
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    print(f"✅ Importación: {summary['added']} agregadas, {summary['updated']} actualizadas, "
+          f"{summary['duplicates']} duplicadas, {summary['invalid']} inválidas en {summary['seconds']} s")
+    return summary
+
+
+def export_deck(file: IO[str], fmt: str, batch_size: int = 1000, namespace: Optional[str] = None) -> int:
+    """
+    Escribe todo el mazo en `file` página a página, sin cargarlo entero.
+
+    Returns:
+        Número de flashcards exportadas
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(["palabra", "traduccion", "ejemplo_fr"])
+        for flashcard in iter_flashcards(batch_size, namespace):
+            writer.writerow([flashcard["palabra"], flashcard["traduccion"], flashcard["ejemplo_fr"]])
+            count += 1
+    elif fmt == "jsonl":
+        for flashcard in iter_flashcards(batch_size, namespace):
+            row = {field: flashcard[field] for field in ("palabra", "traduccion", "ejemplo_fr", "created_at")}
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    elif fmt == "anki":
+        # Cabeceras del formato de texto de Anki: separador, sin HTML y nombre de cada columna
+        file.write("#separator:tab\n#html:false\n#columns:" + "\t".join(ANKI_COLUMNS) + "\n")
+        for flashcard in iter_flashcards(batch_size, namespace):
+            fields = [" ".join(flashcard[field].split()) for field in ("palabra", "traduccion", "ejemplo_fr")]
+            file.write("\t".join(fields) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Formato desconocido: {fmt} (usa {', '.join(FORMATS)})")
+    print(f"✅ Exportadas {count} flashcards ({fmt})")
+    return count
+
+
+def _import_job(report, data: bytes, fmt: str, update_existing: bool = False, namespace: Optional[str] = None) -> dict:
+    # El total es aproximado: una fila por línea
+    total = max(1, data.count(b"\n"))
+    report(done=0, total=total)
+    # Los embeddings de la importación van por el carril masivo: los guardados desde la interfaz pasan antes
+    with lane(BULK), io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="") as file:
+        return import_deck(
+            file, fmt, update_existing=update_existing, namespace=namespace,
+            on_progress=lambda read, added: report(done=min(read, total)),
+        )
+
+
+def submit_import_job(data: bytes, fmt: str, update_existing: bool = False, namespace: Optional[str] = None) -> str:
+    """
+    Encola la importación de un mazo (contenido del archivo en bytes) y devuelve el id del trabajo.
+    """
+    return job_queue.submit("import", _import_job, data, fmt, update_existing=update_existing, namespace=namespace)
+
+
+def export_deck_bytes(fmt: str, namespace: Optional[str] = None) -> bytes:
+    """
+    Exporta el mazo a bytes UTF-8 (para descargarlo desde la interfaz).
+
+    Las flashcards se escriben página a página en un archivo temporal, que se cierra (y se
+    borra) al leerlo: en memoria queda solo el resultado, una copia del mazo exportado.
+    """
+    with tempfile.TemporaryFile() as file:
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        export_deck(text, fmt, namespace=namespace)
+        text.flush()
+        file.seek(0)
+        data = file.read()
+        text.detach()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa o exporta mazos de flashcards (CSV, JSONL o texto de Anki).")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="Archivo de origen o destino")
+    parser.add_argument("--format", choices=FORMATS, help="Por defecto se deduce de la extensión")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--update-existing", action="store_true", help="Actualizar las flashcards que ya existen")
+    parser.add_argument("--deck", help='Mazo "usuario/mazo" (por defecto, el mazo compartido de siempre)')
+    parser.add_argument("--no-near-duplicates", action="store_true", help="No comprobar casi-duplicados (más rápido)")
+    args = parser.parse_args()
+
+    try:
+        fmt = args.format or detect_format(args.path)
+    except ValueError as e:
+        parser.error(str(e))
+    namespace = normalize_namespace(args.deck)
+    if args.action == "import":
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            summary = import_deck(
+                f, fmt, batch_size=args.batch_size, update_existing=args.update_existing,
+                near_duplicate_threshold=None if args.no_near_duplicates else NEAR_DUPLICATE_THRESHOLD,
+                on_progress=lambda read, added: print(f"  {read} filas leídas, {added} agregadas", flush=True),
+                namespace=namespace,
+            )
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        with open(args.path, "w", encoding="utf-8", newline="") as f:
+            export_deck(f, fmt, batch_size=args.batch_size, namespace=namespace)
+
+
+if __name__ == "__main__":
+    main()
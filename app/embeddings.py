@@ -0,0 +1,95 @@
+import unicodedata
+from array import array
+from typing import Callable, List, Union
+
+from langchain_core.embeddings import Embeddings
+
+from cache import DiskCache, make_key
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza un texto para usarlo como clave de caché (Unicode NFC y espacios colapsados).
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un cliente de embeddings con una caché persistente por texto normalizado y modelo.
+
+    Solo los textos que no están en caché se envían al cliente, en lotes de `batch_size`.
+
+    Args:
+        embeddings: Cliente real (por ejemplo OpenAIEmbeddings), o una función que lo crea; en ese
+            caso se llama la primera vez que falta un embedding en la caché.
+        model: Nombre del modelo; forma parte de la clave para no mezclar vectores.
+        cache: DiskCache donde se guardan los vectores (float32).
+        batch_size: Textos por llamada al cliente real.
+        metrics: Metrics opcional donde registrar duración, bytes y tokens estimados de cada llamada.
+        scheduler: RequestScheduler opcional por el que pasan las llamadas (límites por minuto,
+            reintentos y unión de lotes idénticos simultáneos).
+    """
+
+    def __init__(self, embeddings: Union[Embeddings, Callable[[], Embeddings]], model: str, cache: DiskCache, batch_size: int = 256,
+                 metrics=None, scheduler=None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.scheduler = scheduler
+
+    def _client(self) -> Embeddings:
+        if not isinstance(self.embeddings, Embeddings):
+            self.embeddings = self.embeddings()
+        return self.embeddings
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.scheduler is None:
+            return self._client().embed_documents(texts)
+        # La API de embeddings no devuelve el uso a LangChain: estimamos ~4 caracteres por token
+        return self.scheduler.call(
+            lambda: self._client().embed_documents(texts),
+            tokens=sum(len(text) // 4 + 1 for text in texts),
+            key=make_key("embeddings", self.model, *texts),
+        )
+
+    def _key(self, text: str) -> str:
+        return make_key("embedding", self.model, normalize_text(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Textos únicos que faltan, en el orden en que aparecen
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            texts = [text for _, text in batch]
+            if self.metrics is None:
+                vectors = self._embed(texts)
+            else:
+                with self.metrics.timer("embeddings.api"):
+                    vectors = self._embed(texts)
+                self.metrics.add_bytes("embeddings.request", sum(len(text.encode("utf-8")) for text in texts))
+                self.metrics.record_usage(self.model, sum(len(text) // 4 + 1 for text in texts))
+            encoded = [(key, array("f", vector).tobytes()) for (key, _), vector in zip(batch, vectors)]
+            self.cache.set_many(encoded)
+            cached.update(encoded)
+
+        return [array("f", cached[key]).tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        """
+        Devuelve aciertos, fallos, tasa de acierto, entradas y bytes de la caché de embeddings.
+        """
+        return self.cache.stats()
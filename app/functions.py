@@ -1,33 +1,429 @@
-from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_community.vectorstores import Chroma
 import json
 import base64
+import hashlib
 from dotenv import load_dotenv
 import uuid
-from langchain_openai import OpenAIEmbeddings
 from datetime import datetime
+import asyncio
+import atexit
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+from cache import DiskCache, make_key
+from card_store import open_card_store
+from jobs import JobQueue
+from llm_scheduler import BULK, RequestScheduler, estimate_tokens, lane
+from metrics import Metrics, start_metrics_server
+from scheduler import ReviewScheduler
+from streaming import FlashcardStreamParser
+from word_index import WordIndex, fold
+
+# LangChain, Chroma, numpy y Pillow tardan segundos en importarse: se cargan dentro de las
+# funciones que los usan, así las vistas que no llaman al modelo ni a la base no los pagan
+if TYPE_CHECKING:
+    import numpy as np
+    from langchain_community.vectorstores import Chroma
+    from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
-def image_to_text(image_path: str) -> dict:
+# Modelo de chat y versión de los prompts (subirla invalida las respuestas cacheadas)
+LLM_MODEL = "gpt-4o-mini"
+PROMPT_VERSION = "1"
+# Máximo de llamadas simultáneas al modelo en los procesos por lotes
+MAX_CONCURRENCY = int(os.getenv("FLASHCARDS_MAX_CONCURRENCY", "4"))
+# Palabras por llamada en la generación masiva
+BULK_CHUNK_SIZE = int(os.getenv("FLASHCARDS_BULK_CHUNK_SIZE", "25"))
+# Flashcards que se cargan por sesión de Study Mode
+STUDY_SESSION_SIZE = int(os.getenv("FLASHCARDS_STUDY_SESSION_SIZE", "20"))
+# Similitud a partir de la cual dos flashcards se consideran casi duplicadas
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("FLASHCARDS_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Ids por llamada al borrar de Chroma en lote (pasa cada id como variable de SQLite)
+DELETE_BATCH_SIZE = int(os.getenv("FLASHCARDS_DELETE_BATCH_SIZE", "5000"))
+
+# Configuración del almacén vectorial (se puede sobrescribir con variables de entorno)
+CHROMA_PERSIST_DIR = os.getenv("FLASHCARDS_CHROMA_DIR", "data/chroma_db")
+CHROMA_COLLECTION = os.getenv("FLASHCARDS_COLLECTION", "flashcards")
+EMBEDDINGS_MODEL = "text-embedding-3-small"
+EMBEDDINGS_BATCH_SIZE = int(os.getenv("FLASHCARDS_EMBEDDINGS_BATCH_SIZE", "256"))
+
+# Métricas del proceso: duración por etapa, bytes, tokens y coste estimado
+metrics = Metrics()
+METRICS_PORT = os.getenv("FLASHCARDS_METRICS_PORT")
+# Muestra el panel de métricas en la barra lateral de la app
+ADMIN_PANEL = os.getenv("FLASHCARDS_ADMIN", "").lower() in ("1", "true", "yes")
+if METRICS_PORT:
+    start_metrics_server(metrics, int(METRICS_PORT))
+
+# Límites de la API por minuto (los de tu cuenta de OpenAI; 0 = sin límite). Todas las sesiones del
+# proceso comparten el cupo: las llamadas esperan turno en vez de recibir 429, y las interactivas
+# pasan delante de las masivas. El planificador es quien reintenta, así que los clientes no lo hacen
+LLM_RPM = int(os.getenv("FLASHCARDS_LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("FLASHCARDS_LLM_TPM", "200000"))
+EMBEDDINGS_RPM = int(os.getenv("FLASHCARDS_EMBEDDINGS_RPM", "3000"))
+EMBEDDINGS_TPM = int(os.getenv("FLASHCARDS_EMBEDDINGS_TPM", "1000000"))
+LLM_MAX_RETRIES = int(os.getenv("FLASHCARDS_LLM_MAX_RETRIES", "5"))
+llm_scheduler = RequestScheduler("llm", rpm=LLM_RPM, tpm=LLM_TPM, max_retries=LLM_MAX_RETRIES, metrics=metrics)
+embeddings_scheduler = RequestScheduler(
+    "embeddings", rpm=EMBEDDINGS_RPM, tpm=EMBEDDINGS_TPM, max_retries=LLM_MAX_RETRIES, metrics=metrics
+)
+
+# Caché persistente de embeddings: solo los textos nuevos van al endpoint de embeddings
+embeddings_cache = DiskCache(
+    os.getenv("FLASHCARDS_EMBEDDINGS_CACHE_PATH", "data/cache/embeddings.sqlite"),
+    max_bytes=int(os.getenv("FLASHCARDS_EMBEDDINGS_CACHE_MAX_MB", "500")) * 1024 * 1024,
+)
+
+# Mazos: cada usuario/mazo ("ana/verbos") vive en su propia colección de Chroma. El namespace
+# None es el mazo de siempre (colección CHROMA_COLLECTION e ids sin prefijo)
+DEFAULT_DECK = "default"
+# Handles de colección que se mantienen abiertos (los menos usados se sueltan)
+MAX_OPEN_DECKS = int(os.getenv("FLASHCARDS_MAX_OPEN_DECKS", "64"))
+
+# Cliente de Chroma compartido por todo el proceso (todas las sesiones de Streamlit lo reutilizan)
+_store_lock = threading.Lock()
+_chroma_client = None
+_embedding_function = None
+_vectorstores = OrderedDict()
+_store_config = {
+    "persist_directory": CHROMA_PERSIST_DIR,
+    "collection_name": CHROMA_COLLECTION,
+    "embedding_function": None,
+}
+# Estado en memoria de cada mazo: lock de escritura e índice de palabras. La versión del mazo
+# la lleva el card_store, así que también cambia con las escrituras de otros procesos
+_decks = {}
+
+def normalize_namespace(namespace: str = None):
     """
-    Analiza una imagen, detecta palabras resaltadas y las devuelve en formato JSON.
+    Normaliza un namespace "usuario/mazo" (minúsculas, espacios colapsados). Sin usuario y con el
+    mazo por defecto devuelve None.
     """
-    # Configuramos el LLM para que devuelva estrictamente un objeto JSON
-    llm = ChatOpenAI(
-        model="gpt-4o-mini", 
-        temperature=0,
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
+    if namespace is None:
+        return None
+    user, _, deck = namespace.rpartition("/")
+    return deck_namespace(user, deck)
 
-    # Leemos la imagen en binario
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
+def deck_namespace(user: str = None, deck: str = None):
+    """
+    Construye el namespace de un mazo: "usuario/mazo", o None para el mazo por defecto sin usuario.
+    """
+    user = normalize_word((user or "").replace("/", " "))
+    deck = normalize_word((deck or "").replace("/", " ")) or DEFAULT_DECK
+    if not user and deck == DEFAULT_DECK:
+        return None
+    return f"{user}/{deck}"
+
+def split_namespace(namespace: str = None) -> tuple:
+    """
+    Devuelve (usuario, mazo) de un namespace; el usuario es "" si no hay.
+    """
+    if namespace is None:
+        return "", DEFAULT_DECK
+    user, _, deck = namespace.rpartition("/")
+    return user, deck
+
+def _collection_name(namespace: str = None) -> str:
+    base = _store_config["collection_name"]
+    if namespace is None:
+        return base
+    # Chroma admite 3-63 caracteres [a-zA-Z0-9._-]; el hash evita choques entre nombres parecidos
+    slug = re.sub(r"[^a-z0-9]+", "-", fold(namespace)).strip("-")
+    digest = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:12]
+    return f"{base}-{slug[:max(0, 63 - len(base) - 14)]}-{digest}".replace("--", "-")
+
+def _deck_state(namespace: str = None) -> dict:
+    state = _decks.get(namespace)
+    if state is None:
+        with _store_lock:
+            state = _decks.setdefault(namespace, {
+                "write_lock": threading.RLock(),
+                "word_index": WordIndex(),
+                "index_lock": threading.Lock(),
+                "index_thread": None,
+            })
+    return state
+
+def configure_vectorstore(persist_directory: str = None, collection_name: str = None, embedding_function=None):
+    """
+    Cambia la ruta, la colección base o la función de embeddings del almacén compartido.
+
+    Cierra el cliente actual; el siguiente acceso abre uno nuevo con la configuración dada.
+    """
+    global _cards_migrated
+    close_vectorstore()
+    with _store_lock:
+        _decks.clear()
+        _cards_migrated = False
+        if persist_directory is not None:
+            _store_config["persist_directory"] = persist_directory
+        if collection_name is not None:
+            _store_config["collection_name"] = collection_name
+        if embedding_function is not None:
+            _store_config["embedding_function"] = embedding_function
+
+def _openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=EMBEDDINGS_MODEL, chunk_size=EMBEDDINGS_BATCH_SIZE, max_retries=0)
+
+def get_vectorstore(namespace: str = None) -> "Chroma":
+    """
+    Devuelve el almacén vectorial del mazo `namespace`, creando su colección la primera vez que se usa.
+
+    Todos los mazos comparten un cliente de Chroma y la función de embeddings. El cliente de
+    OpenAI se crea la primera vez que hace falta calcular un embedding, así que las lecturas
+    (Study, Manage) no cargan langchain_openai.
+    """
+    namespace = normalize_namespace(namespace)
+    global _chroma_client, _embedding_function
+    with _store_lock:
+        vectorstore = _vectorstores.get(namespace)
+        if vectorstore is not None:
+            _vectorstores.move_to_end(namespace)
+            return vectorstore
+
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+        from embeddings import CachedEmbeddings
+
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path=_store_config["persist_directory"])
+            _embedding_function = _store_config["embedding_function"] or CachedEmbeddings(
+                _openai_embeddings,
+                model=EMBEDDINGS_MODEL,
+                cache=embeddings_cache,
+                batch_size=EMBEDDINGS_BATCH_SIZE,
+                metrics=metrics,
+                scheduler=embeddings_scheduler,
+            )
+        vectorstore = Chroma(
+            client=_chroma_client,
+            embedding_function=_embedding_function,
+            collection_name=_collection_name(namespace),
+            collection_metadata={"namespace": namespace} if namespace else None,
+        )
+        _vectorstores[namespace] = vectorstore
+        # Soltar un handle no borra nada: se vuelve a abrir (barato) si el mazo se usa otra vez
+        while len(_vectorstores) > MAX_OPEN_DECKS:
+            _vectorstores.popitem(last=False)
+    return vectorstore
+
+def list_decks(user: str = None) -> list:
+    """
+    Devuelve los nombres de los mazos de `user` con flashcards guardadas o creados con create_deck()
+    (el mazo por defecto, siempre primero).
+    """
+    prefix = normalize_word((user or "").replace("/", " ")) + "/"
+    decks = [split_namespace(namespace)[1] for namespace in review_scheduler.list_decks(prefix)]
+    return [DEFAULT_DECK] + [deck for deck in decks if deck != DEFAULT_DECK]
+
+def create_deck(user: str = None, deck: str = None):
+    """
+    Registra un mazo vacío para que aparezca en list_decks() y devuelve su namespace.
+
+    No abre Chroma: la colección se crea al guardar la primera flashcard.
+    """
+    namespace = deck_namespace(user, deck)
+    if namespace is not None:
+        review_scheduler.register_deck(namespace)
+    return namespace
+
+def deck_version(namespace: str = None) -> int:
+    """
+    Devuelve la versión del mazo: crece cada vez que se agregan, editan o borran flashcards, desde
+    este proceso o desde otro (una importación por la línea de comandos, otra réplica de la app).
+    """
+    _ensure_card_store()
+    return card_store.version(normalize_namespace(namespace) or "")
+
+def get_metrics_summary() -> dict:
+    """
+    Devuelve p50/p95 por etapa, bytes, tokens y coste estimado acumulados en este proceso.
+    """
+    return metrics.summary()
+
+def metrics_text() -> str:
+    """
+    Devuelve las métricas en formato de texto de Prometheus.
+    """
+    return metrics.prometheus_text()
+
+def reset_metrics():
+    metrics.reset()
+    llm_scheduler.reset_stats()
+    embeddings_scheduler.reset_stats()
+
+def cache_stats() -> dict:
+    """
+    Devuelve las estadísticas de la caché de respuestas del LLM.
+    """
+    return response_cache.stats()
+
+def embeddings_cache_stats() -> dict:
+    """
+    Devuelve la tasa de acierto y el tamaño de la caché de embeddings.
+    """
+    return embeddings_cache.stats()
+
+def scheduler_stats() -> dict:
+    """
+    Devuelve llamadas, reintentos, 429, peticiones unidas y cola de los planificadores de chat y embeddings.
+    """
+    return {"llm": llm_scheduler.stats(), "embeddings": embeddings_scheduler.stats()}
+
+def close_vectorstore():
+    """
+    Cierra el cliente de Chroma compartido (se llama automáticamente al salir).
+    """
+    global _chroma_client, _embedding_function
+    with _store_lock:
+        client, _chroma_client = _chroma_client, None
+        _embedding_function = None
+        _vectorstores.clear()
+    if client is not None and hasattr(client, "close"):
+        client.close()
+
+atexit.register(close_vectorstore)
+atexit.register(embeddings_cache.close)
+
+def _ensure_card_store():
+    """
+    Copia al card_store, una sola vez, las flashcards que solo están en Chroma (guardadas antes de
+    que existiera). En una instalación nueva no abre Chroma.
+    """
+    global _cards_migrated
+    if _cards_migrated:
+        return
+    with _migration_lock:
+        if _cards_migrated:
+            return
+        persist_directory = _store_config["persist_directory"]
+        marker = f"cards_migrated:{os.path.abspath(persist_directory)}:{_store_config['collection_name']}"
+        if not card_store.get_meta(marker):
+            if os.path.isdir(persist_directory):
+                with metrics.timer("card_store.migrate"):
+                    _copy_chroma_to_card_store()
+            card_store.set_meta(marker, datetime.now().isoformat())
+        _cards_migrated = True
+
+def _copy_chroma_to_card_store():
+    get_vectorstore()
+    base = _store_config["collection_name"]
+    for collection in _chroma_client.list_collections():
+        # La colección base es el mazo por defecto; las de los demás mazos guardan su namespace
+        if collection.name == base:
+            namespace = None
+        elif collection.name.startswith(base + "-") and (collection.metadata or {}).get("namespace"):
+            namespace = collection.metadata["namespace"]
+        else:
+            continue
+        copied = 0
+        for cards in _chroma_card_batches(get_vectorstore(namespace)._collection):
+            card_store.add(cards, deck=namespace or "")
+            copied += len(cards)
+        print(f"✅ Copiadas {copied} flashcards de Chroma al card_store ({namespace or DEFAULT_DECK})")
+
+def _chroma_card_batches(collection, batch_size: int = 5000):
+    # Por páginas: un único get de una colección muy grande supera el límite de variables de SQLite
+    for offset in range(0, collection.count(), batch_size):
+        results = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        if not results["ids"]:
+            break
+        yield [
+            {
+                "id": u_id,
+                "palabra": flashcard["palabra"],
+                "traduccion": flashcard["traduccion"],
+                "ejemplo_fr": flashcard.get("ejemplo_fr") or "",
+                "created_at": flashcard.get("created_at"),
+            }
+            for u_id, flashcard in zip(results["ids"], results["metadatas"])
+        ]
+
+# Trabajos de extracción y generación en segundo plano (fuera del hilo de Streamlit)
+JOB_WORKERS = int(os.getenv("FLASHCARDS_JOB_WORKERS", "4"))
+job_queue = JobQueue(os.getenv("FLASHCARDS_DB_PATH", "data/flashcards.sqlite"), max_workers=JOB_WORKERS)
+atexit.register(job_queue.shutdown)
+
+# Estado de repaso (repetición espaciada) de cada flashcard
+review_scheduler = ReviewScheduler(os.getenv("FLASHCARDS_DB_PATH", "data/flashcards.sqlite"))
+atexit.register(review_scheduler.close)
+
+# Datos de cada flashcard con sus propios índices: listar, buscar, contar y borrar no pasan por
+# Chroma ni necesitan embeddings. Chroma queda solo para las consultas de similitud
+card_store = open_card_store(
+    os.getenv("FLASHCARDS_CARD_STORE", "sqlite"), os.getenv("FLASHCARDS_DB_PATH", "data/flashcards.sqlite")
+)
+atexit.register(card_store.close)
+# Las flashcards de versiones anteriores solo están en Chroma: se copian al card_store una vez
+_cards_migrated = False
+_migration_lock = threading.Lock()
+
+# Caché persistente de respuestas del LLM (misma imagen o misma palabra => sin llamada de red)
+CACHE_DISABLED = os.getenv("FLASHCARDS_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+response_cache = DiskCache(
+    os.getenv("FLASHCARDS_CACHE_PATH", "data/cache/llm_responses.sqlite"),
+    max_bytes=int(os.getenv("FLASHCARDS_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    max_age=float(os.getenv("FLASHCARDS_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+)
+atexit.register(response_cache.close)
+
+def normalize_word(palabra: str) -> str:
+    """
+    Normaliza una palabra para usarla como clave (minúsculas, espacios colapsados, Unicode NFC).
+    """
+    return " ".join(unicodedata.normalize("NFC", palabra).lower().split())
+
+def _cache_get(key: str, use_cache: bool):
+    if not use_cache or CACHE_DISABLED:
+        return None
+    cached = response_cache.get(key)
+    return json.loads(cached) if cached is not None else None
+
+def _cache_set(key: str, result: dict, use_cache: bool):
+    # Solo guardamos respuestas válidas
+    if use_cache and not CACHE_DISABLED and "error" not in result:
+        response_cache.set(key, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+
+def _parse_flashcards_response(content: str) -> dict:
+    # Parseamos la respuesta
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return {"error": "El modelo no devolvió un JSON válido", "raw": content}
+
+def _read_image(image) -> bytes:
+    # Aceptamos una ruta o los bytes del archivo ya en memoria
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    with open(image, "rb") as f:
+        return f.read()
+
+def _image_cache_key(image_bytes: bytes, preprocess: bool, crop_highlights: bool) -> str:
+    from image_processing import MAX_SIDE
+    variant = f"preprocess={preprocess},crop={crop_highlights},max_side={MAX_SIDE}"
+    return make_key("image_to_text", LLM_MODEL, PROMPT_VERSION, variant, hashlib.sha256(image_bytes).digest())
+
+def _extraction_messages(image_bytes: bytes, preprocess: bool, crop_highlights: bool) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from image_processing import detect_mime_type, preprocess_image
+
+    # Reducimos y recomprimimos la imagen (o usamos los bytes originales con su tipo real)
+    with metrics.timer("extract.preprocess"):
+        if preprocess:
+            prepared = preprocess_image(image_bytes, crop_highlights=crop_highlights)
+        else:
+            prepared = {"data": image_bytes, "mime_type": detect_mime_type(image_bytes), "regions": 0}
 
     # Codificamos a base64
-    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    with metrics.timer("extract.encode"):
+        image_b64 = base64.b64encode(prepared["data"]).decode("utf-8")
+    metrics.add_bytes("extract.image", len(image_bytes))
+    metrics.add_bytes("extract.request", len(image_b64))
 
     # Definimos las instrucciones detalladas
     system_message = SystemMessage(
@@ -46,150 +442,796 @@ def image_to_text(image_path: str) -> dict:
             {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{image_b64}"
+                    "url": f"data:{prepared['mime_type']};base64,{image_b64}"
                 }
             },
             {
                 "type": "text",
-                "text": "Analiza esta imagen y extrae las palabras resaltadas siguiendo el formato JSON solicitado."
+                "text": (
+                    "Analiza esta imagen y extrae las palabras resaltadas siguiendo el formato JSON solicitado."
+                    + (" La imagen contiene solo recortes de las zonas resaltadas de la página." if prepared["regions"] else "")
+                )
             }
         ]
     )
+    return [system_message, human_message]
+
+# Bucle de eventos compartido: el cliente HTTP async de OpenAI se reutiliza entre llamadas
+# y queda ligado al primer bucle que lo usa, así que un asyncio.run por lote falla desde el segundo
+_loop = None
+_loop_lock = threading.Lock()
+
+def _run_async(coro):
+    """
+    Ejecuta una corrutina en el bucle de eventos del proceso y espera su resultado.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="flashcards-asyncio", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# Cliente del modelo compartido por todo el proceso (se crea en la primera llamada)
+_llm = None
+_llm_lock = threading.Lock()
+
+def _json_llm() -> "ChatOpenAI":
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+
+                # Configuramos el LLM para que devuelva estrictamente un objeto JSON
+                _llm = ChatOpenAI(
+                    model=LLM_MODEL, 
+                    temperature=0,
+                    stream_usage=True,
+                    max_retries=0,
+                    model_kwargs={"response_format": {"type": "json_object"}}
+                )
+    return _llm
+
+def get_llm() -> "ChatOpenAI":
+    """
+    Devuelve el cliente del modelo del proceso, creándolo (e importando LangChain) si hace falta.
+    """
+    return _json_llm()
+
+def _record_usage(message):
+    # Tokens que devuelve la API (en streaming llegan en el último trozo)
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        metrics.record_usage(LLM_MODEL, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+def _used_tokens(message) -> int:
+    # Uso real de una respuesta (o trozo) para corregir la estimación del planificador
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens", 0) if usage else 0
+
+# Tokens de respuesta que se reservan por flashcard al estimar una llamada (una imagen trae ~10)
+TOKENS_PER_CARD = 60
+
+@metrics.timer("extract.total")
+def image_to_text(image_path, use_cache: bool = True, preprocess: bool = True, crop_highlights: bool = False) -> dict:
+    """
+    Analiza una imagen, detecta palabras resaltadas y las devuelve en formato JSON.
+
+    `image_path` puede ser una ruta o los bytes de la imagen.
+
+    Si la misma imagen (mismos bytes) ya se procesó con este modelo y versión de prompt,
+    devuelve la respuesta cacheada. `use_cache=False` fuerza una llamada nueva.
+
+    Con `preprocess` la imagen se reorienta, se reduce y se recomprime antes de enviarla;
+    con `crop_highlights` solo se envían recortes de las zonas resaltadas.
+    """
+    # Leemos la imagen en binario
+    with metrics.timer("extract.read"):
+        image_bytes = _read_image(image_path)
+
+    cache_key = _image_cache_key(image_bytes, preprocess, crop_highlights)
+    with metrics.timer("extract.cache"):
+        cached = _cache_get(cache_key, use_cache)
+    if cached is not None:
+        return cached
 
     # Invocamos al modelo
-    response = llm.invoke([system_message, human_message])
+    messages = _extraction_messages(image_bytes, preprocess, crop_highlights)
+    with metrics.timer("extract.llm"):
+        response = llm_scheduler.call(
+            lambda: _json_llm().invoke(messages), tokens=estimate_tokens(messages, 10 * TOKENS_PER_CARD),
+            key=cache_key, usage=_used_tokens,
+        )
+    _record_usage(response)
     
-    # Parseamos la respuesta
+    with metrics.timer("extract.parse"):
+        result = _parse_flashcards_response(response.content)
+    _cache_set(cache_key, result, use_cache)
+    return result
+
+def image_to_text_stream(image_path, use_cache: bool = True, preprocess: bool = True, crop_highlights: bool = False):
+    """
+    Como `image_to_text`, pero devuelve cada flashcard en cuanto el modelo termina de escribirla.
+
+    Si el flujo se corta, las flashcards ya recibidas se conservan (solo se lanza un error
+    si no llegó ninguna). Los objetos incompletos se descartan, como en la generación masiva.
+    La respuesta se cachea únicamente cuando llegó completa.
+
+    Yields:
+        Dicts {"palabra": ..., "traduccion": ..., "ejemplo_fr": ...}
+    """
+    with metrics.timer("extract.read"):
+        image_bytes = _read_image(image_path)
+
+    cache_key = _image_cache_key(image_bytes, preprocess, crop_highlights)
+    with metrics.timer("extract.cache"):
+        cached = _cache_get(cache_key, use_cache)
+    if cached is not None:
+        yield from (flashcard for flashcard in cached.get("flashcards", []) if _valid_flashcard(flashcard))
+        return
+
+    parser = FlashcardStreamParser()
+    flashcards = []
+    messages = _extraction_messages(image_bytes, preprocess, crop_highlights)
+    t0 = time.perf_counter()
     try:
-        return json.loads(response.content)
-    except json.JSONDecodeError:
-        return {"error": "El modelo no devolvió un JSON válido", "raw": response.content}
+        chunks = llm_scheduler.stream(
+            lambda: _json_llm().stream(messages), tokens=estimate_tokens(messages, 10 * TOKENS_PER_CARD),
+            key=cache_key, usage=_used_tokens,
+        )
+        for chunk in chunks:
+            _record_usage(chunk)
+            for flashcard in parser.feed(chunk.content):
+                # Un objeto sin palabra, traducción o ejemplo no se muestra ni se cachea
+                if not _valid_flashcard(flashcard):
+                    continue
+                if not flashcards:
+                    metrics.observe("extract.first_card", time.perf_counter() - t0)
+                flashcards.append(flashcard)
+                yield flashcard
+    except Exception as e:
+        if not flashcards:
+            raise
+        print(f"⚠️ El flujo se cortó tras {len(flashcards)} flashcards: {e}")
+        return
+    finally:
+        metrics.observe("extract.llm", time.perf_counter() - t0)
+
+    if parser.complete:
+        _cache_set(cache_key, {"flashcards": flashcards}, use_cache)
+    elif not flashcards:
+        raise ValueError("El modelo no devolvió un JSON válido")
+    else:
+        print(f"⚠️ Respuesta incompleta: se conservan {len(flashcards)} flashcards")
+
+async def aimage_to_text(image_path, use_cache: bool = True, preprocess: bool = True, crop_highlights: bool = False) -> dict:
+    """
+    Versión asíncrona de `image_to_text` (el preprocesado corre en un hilo aparte).
+    """
+    image_bytes = await asyncio.to_thread(_read_image, image_path)
+
+    cache_key = _image_cache_key(image_bytes, preprocess, crop_highlights)
+    cached = await asyncio.to_thread(_cache_get, cache_key, use_cache)
+    if cached is not None:
+        return cached
+
+    messages = await asyncio.to_thread(_extraction_messages, image_bytes, preprocess, crop_highlights)
+    with metrics.timer("extract.llm"):
+        response = await llm_scheduler.acall(
+            lambda: _json_llm().ainvoke(messages), tokens=estimate_tokens(messages, 10 * TOKENS_PER_CARD),
+            key=cache_key, usage=_used_tokens,
+        )
+    _record_usage(response)
+
+    with metrics.timer("extract.parse"):
+        result = _parse_flashcards_response(response.content)
+    await asyncio.to_thread(_cache_set, cache_key, result, use_cache)
+    return result
+
+async def aextract_images(images: list, max_concurrency: int = MAX_CONCURRENCY, **kwargs):
+    """
+    Extrae flashcards de varias imágenes en paralelo, con como mucho `max_concurrency`
+    llamadas al modelo a la vez.
+
+    Genera tuplas (índice, resultado) en el orden en que terminan las imágenes. Un fallo
+    en una imagen se devuelve como {"error": ...} y no detiene al resto.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(index, image):
+        async with semaphore:
+            try:
+                return index, await aimage_to_text(image, **kwargs)
+            except Exception as e:
+                return index, {"error": str(e)}
+
+    for finished in asyncio.as_completed([run(i, image) for i, image in enumerate(images)]):
+        yield await finished
+
+def extract_images(images: list, max_concurrency: int = MAX_CONCURRENCY, on_result=None, **kwargs) -> dict:
+    """
+    Extrae flashcards de varias imágenes (rutas o bytes) y las combina sin duplicados.
+
+    Args:
+        images: Lista de rutas o bytes de imágenes.
+        max_concurrency: Máximo de llamadas simultáneas al modelo.
+        on_result: Callback opcional on_result(índice, resultado) que se llama en cuanto
+            termina cada imagen (por ejemplo, para ir pintando la vista previa).
+
+    Returns:
+        Dict con flashcards (combinadas), duplicates y errors ({índice: mensaje})
+    """
+    results = [None] * len(images)
+
+    async def run_all():
+        async for index, result in aextract_images(images, max_concurrency=max_concurrency, **kwargs):
+            results[index] = result
+            if on_result is not None:
+                on_result(index, result)
+
+    _run_async(run_all())
+
+    merged = merge_flashcards([r for r in results if "error" not in r])
+    merged["errors"] = {i: r["error"] for i, r in enumerate(results) if "error" in r}
+    return merged
+
+def merge_flashcards(results: list) -> dict:
+    """
+    Combina varios resultados {"flashcards": [...]} quedándose con la primera aparición de cada palabra.
+    """
+    merged = {}
+    duplicates = []
+    for result in results:
+        for flashcard in result.get("flashcards", []):
+            key = normalize_word(flashcard["palabra"])
+            if key in merged:
+                duplicates.append(flashcard["palabra"])
+            else:
+                merged[key] = flashcard
+    return {"flashcards": list(merged.values()), "duplicates": duplicates}
+
+def _distance_to_similarity(distance: float, space: str) -> float:
+    # Los embeddings de OpenAI están normalizados: con l2 (al cuadrado) la similitud coseno es 1 - d/2
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+def _unit_rows(vectors: list) -> "np.ndarray":
+    import numpy as np
+
+    # Normalizamos cada vector para que el producto escalar sea la similitud coseno
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def _collection_space(vectorstore: "Chroma") -> str:
+    metadata = vectorstore._collection.metadata or {}
+    return metadata.get("hnsw:space", "l2")
+
+def _filter_near_duplicates(vectorstore: "Chroma", docs: list, ids: list, threshold: float):
+    """
+    Separa los documentos que se parecen demasiado a una flashcard existente o a otro del mismo lote.
+
+    Returns:
+        Tupla (docs, ids, embeddings, near_duplicates) con los que se pueden guardar y los descartados
+    """
+    with metrics.timer("save.embed"):
+        vectors = vectorstore.embeddings.embed_documents([doc.page_content for doc in docs])
+    nearest = {}
+    # Se cuenta en la colección que se consulta (la del mazo de destino), no en el mazo por defecto
+    if vectorstore._collection.count():
+        # Una sola consulta con todos los vectores del lote
+        with metrics.timer("save.near_duplicates"):
+            results = vectorstore._collection.query(
+                query_embeddings=vectors, n_results=1, include=["metadatas", "distances"]
+            )
+        space = _collection_space(vectorstore)
+        for i, (metadatas, distances) in enumerate(zip(results["metadatas"], results["distances"])):
+            if metadatas:
+                nearest[i] = (metadatas[0]["palabra"], _distance_to_similarity(distances[0], space))
+
+    unit = _unit_rows(vectors) if vectors else None
+    kept, near_duplicates = [], []
+    for i, doc in enumerate(docs):
+        match = nearest.get(i)
+        # También comparamos con los que ya vamos a guardar de este mismo lote (una fila de productos escalares)
+        if kept:
+            similarities = unit[kept] @ unit[i]
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+            if similarity >= threshold and (match is None or similarity > match[1]):
+                match = (docs[kept[best]].metadata["palabra"], similarity)
+        if match is not None and match[1] >= threshold:
+            near_duplicates.append({"palabra": doc.metadata["palabra"], "similar_to": match[0], "similarity": round(match[1], 3)})
+            continue
+        kept.append(i)
+    return [docs[i] for i in kept], [ids[i] for i in kept], [vectors[i] for i in kept], near_duplicates
+
+def _card_id(palabra: str, namespace: str = None) -> str:
+    # ID determinístico a partir de la palabra normalizada; en los mazos con nombre, con un
+    # prefijo propio del mazo (el mazo por defecto conserva los ids de siempre)
+    if namespace is None:
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, palabra.strip().lower()))
+    return str(uuid.uuid5(uuid.uuid5(uuid.NAMESPACE_URL, f"flashcards:{namespace}"), palabra.strip().lower()))
 
-def save_flashcards_to_db(flashcards: dict):
+@metrics.timer("save.total")
+def save_flashcards_to_db(flashcards: dict, near_duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                          namespace: str = None):
     """
-    Guarda flashcards en ChromaDB, evitando duplicados por ID.
+    Guarda flashcards en el card_store y sus embeddings en ChromaDB, evitando duplicados por ID.
+    
+    La comprobación de duplicados y la escritura se hacen bajo el lock del mazo, así que varias
+    sesiones pueden guardar a la vez en el mismo mazo sin duplicar flashcards.
     
     Args:
         flashcards: Dict con estructura {"flashcards": [{"palabra": ..., "traduccion": ..., "ejemplo_fr": ...}]}
+        near_duplicate_threshold: Similitud (0-1) a partir de la cual una flashcard se considera un
+            casi-duplicado de otra ya guardada ("le chat" / "chat") y se omite. None desactiva la comprobación.
+        namespace: Mazo ("usuario/mazo"); None es el mazo por defecto.
     
     Returns:
-        Dict con vectorstore, cantidad agregada y duplicados encontrados
+        Dict con vectorstore, cantidad agregada, duplicados y casi-duplicados encontrados
     """
     
+    from langchain_core.documents import Document
+
     # Conectar a DB (crea si no existe)
-    embeddings_function = OpenAIEmbeddings(model="text-embedding-3-small")
-    
-    vectorstore = Chroma(
-        persist_directory="data/chroma_db",
-        embedding_function=embeddings_function,
-        collection_name="flashcards"  # Nombre específico
-    )
+    namespace = normalize_namespace(namespace)
+    _ensure_card_store()
+    vectorstore = get_vectorstore(namespace)
+    deck = _deck_state(namespace)
     
     new_docs = []
     new_ids = []
     duplicates = []
     
+    # Normalizamos y deduplicamos dentro del mismo lote (la misma palabra dos veces en una extracción)
+    candidates = {}
     for flashcard in flashcards["flashcards"]:
-        # Normalizar
         palabra_norm = flashcard["palabra"].strip().lower()
-        traduccion_norm = flashcard["traduccion"].strip().lower()
         
         # Generar ID determinístico
-        u_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, palabra_norm))
-        
-        # Verificar si ya existe
-        try:
-            existing = vectorstore.get(ids=[u_id])
-            if existing and existing['ids']:
+        u_id = _card_id(palabra_norm, namespace)
+        if u_id in candidates:
+            duplicates.append(flashcard["palabra"])
+            continue
+        candidates[u_id] = flashcard
+    
+    with deck["write_lock"]:
+        # Una sola consulta indexada para saber cuáles ya existen
+        existing_ids = set()
+        if candidates:
+            with metrics.timer("save.exists_check"):
+                existing_ids = set(card_store.get(candidates, deck=namespace or ""))
+    
+        for u_id, flashcard in candidates.items():
+            if u_id in existing_ids:
                 duplicates.append(flashcard["palabra"])
                 continue
-        except Exception:
-            pass  # DB vacía o primer documento
         
-        # Crear documento nuevo
-        new_docs.append(
-            Document(
-                page_content=f"{palabra_norm}\n{traduccion_norm}",
-                metadata={
-                    "id": u_id,
-                    "palabra": flashcard["palabra"],
-                    "traduccion": flashcard["traduccion"],
-                    "ejemplo_fr": flashcard["ejemplo_fr"],
-                    "created_at": datetime.now().isoformat(),
-                }
+            palabra_norm = flashcard["palabra"].strip().lower()
+            traduccion_norm = flashcard["traduccion"].strip().lower()
+        
+            # Crear documento nuevo
+            new_docs.append(
+                Document(
+                    page_content=f"{palabra_norm}\n{traduccion_norm}",
+                    metadata={
+                        "id": u_id,
+                        "palabra": flashcard["palabra"],
+                        "traduccion": flashcard["traduccion"],
+                        "ejemplo_fr": flashcard["ejemplo_fr"],
+                        "created_at": datetime.now().isoformat(),
+                    }
+                )
             )
-        )
-        new_ids.append(u_id)
+            new_ids.append(u_id)
     
-    # Guardar solo los nuevos
-    if new_docs:
-        vectorstore.add_documents(documents=new_docs, ids=new_ids)
-        print(f"✅ Agregados {len(new_docs)} flashcards nuevos")
+        # Casi-duplicados: vecinos más cercanos usando los vectores que ya están en Chroma
+        near_duplicates = []
+        new_vectors = None
+        if new_docs and near_duplicate_threshold is not None:
+            new_docs, new_ids, new_vectors, near_duplicates = _filter_near_duplicates(
+                vectorstore, new_docs, new_ids, near_duplicate_threshold
+            )
+    
+        # Guardar solo los nuevos: primero en el card_store y después en Chroma; si Chroma falla
+        # se deshace, para que los dos sigan teniendo las mismas flashcards
+        if new_docs:
+            with metrics.timer("save.card_store"):
+                card_store.add([doc.metadata for doc in new_docs], deck=namespace or "")
+            try:
+                with metrics.timer("save.write"):
+                    if new_vectors is not None:
+                        # Ya tenemos los embeddings: los guardamos directamente sin volver a calcularlos
+                        vectorstore._collection.add(
+                            ids=new_ids,
+                            embeddings=new_vectors,
+                            documents=[doc.page_content for doc in new_docs],
+                            metadatas=[doc.metadata for doc in new_docs],
+                        )
+                    else:
+                        vectorstore.add_documents(documents=new_docs, ids=new_ids)
+            except Exception:
+                card_store.delete(new_ids, deck=namespace or "")
+                raise
+
+            with metrics.timer("save.review_state"):
+                review_scheduler.add_cards(new_ids, deck=namespace or "")
+                if namespace is not None:
+                    review_scheduler.register_deck(namespace)
+            print(f"✅ Agregados {len(new_docs)} flashcards nuevos")
     
     if duplicates:
         print(f"⚠️ Se encontraron {len(duplicates)} duplicados: {duplicates}")
     
+    if near_duplicates:
+        print(f"⚠️ Se encontraron {len(near_duplicates)} casi-duplicados: {near_duplicates}")
+    
     return {
         "vectorstore": vectorstore,
         "added": len(new_docs),
         "duplicates": duplicates,
-        "total_in_db": len(vectorstore.get()['ids']) if vectorstore.get()['ids'] else 0
+        "near_duplicates": near_duplicates,
+        "total_in_db": count_flashcards(namespace)
     }
 
-def get_all_flashcards():
+def count_flashcards(namespace: str = None) -> int:
     """
-    Obtiene todas las flashcards de la base de datos.
+    Devuelve cuántas flashcards hay en el mazo sin leer su contenido.
     """
-    embeddings_function = OpenAIEmbeddings(model="text-embedding-3-small")
-    
-    vectorstore = Chroma(
-        persist_directory="data/chroma_db",
-        embedding_function=embeddings_function,
-        collection_name="flashcards"
+    _ensure_card_store()
+    return card_store.count(deck=normalize_namespace(namespace) or "")
+
+def find_duplicate_flashcards(threshold: float = NEAR_DUPLICATE_THRESHOLD, k: int = 5, batch_size: int = 500,
+                              namespace: str = None) -> list:
+    """
+    Busca grupos de flashcards casi duplicadas en todo el mazo.
+
+    Recorre la colección por lotes y, para cada lote, hace una sola consulta de vecinos más
+    cercanos (k por flashcard) con los embeddings ya guardados: no compara todos contra todos.
+
+    Returns:
+        Lista de grupos (cada uno una lista de {id, palabra, traduccion}), de mayor a menor
+    """
+    vectorstore = get_vectorstore(namespace)
+    collection = vectorstore._collection
+    space = _collection_space(vectorstore)
+    total = collection.count()
+    parent = {}
+
+    def find(u_id):
+        while parent[u_id] != u_id:
+            parent[u_id] = parent[parent[u_id]]
+            u_id = parent[u_id]
+        return u_id
+
+    for offset in range(0, total, batch_size):
+        page = collection.get(limit=batch_size, offset=offset, include=["embeddings"])
+        if not len(page["ids"]):
+            break
+        # Solo ids y distancias: los metadatos se piden al final, únicamente para los grupos encontrados
+        results = collection.query(
+            query_embeddings=page["embeddings"], n_results=min(k + 1, total), include=["distances"]
+        )
+        for u_id, ids, distances in zip(page["ids"], results["ids"], results["distances"]):
+            for other_id, distance in zip(ids, distances):
+                if other_id == u_id or _distance_to_similarity(distance, space) < threshold:
+                    continue
+                parent.setdefault(u_id, u_id)
+                parent.setdefault(other_id, other_id)
+                root_a, root_b = find(u_id), find(other_id)
+                if root_a != root_b:
+                    parent[root_b] = root_a
+
+    groups = {}
+    for u_id in parent:
+        groups.setdefault(find(u_id), []).append(u_id)
+
+    cards = {}
+    if parent:
+        found = collection.get(ids=list(parent), include=["metadatas"])
+        cards.update(zip(found["ids"], found["metadatas"]))
+
+    return sorted(
+        (
+            [{"id": u_id, "palabra": cards[u_id]["palabra"], "traduccion": cards[u_id]["traduccion"]} for u_id in members]
+            for members in groups.values() if len(members) > 1
+        ),
+        key=len,
+        reverse=True,
     )
-    
-    results = vectorstore.get()
-    
+
+def iter_flashcards(batch_size: int = 1000, namespace: str = None):
+    """
+    Recorre todo el mazo por páginas de `batch_size`, sin cargarlo entero en memoria.
+
+    Yields:
+        Dicts {"id", "palabra", "traduccion", "ejemplo_fr", "created_at"}
+    """
+    _ensure_card_store()
+    yield from card_store.iter(deck=normalize_namespace(namespace) or "", batch_size=batch_size)
+
+@metrics.timer("get_all.total")
+def get_all_flashcards(batch_size: int = 5000, namespace: str = None):
+    """
+    Obtiene todas las flashcards del mazo.
+    """
     # Formateamos para que sea facil manejar en el frontend
-    flashcards = []
-    for flashcard in results['metadatas']:
-        flashcards.append({
-            "palabra": flashcard["palabra"],
-            "traduccion": flashcard["traduccion"],
-            "ejemplo_fr": flashcard["ejemplo_fr"]
-        })
-    
-    return flashcards
+    return [
+        {"palabra": flashcard["palabra"], "traduccion": flashcard["traduccion"], "ejemplo_fr": flashcard["ejemplo_fr"]}
+        for flashcard in iter_flashcards(batch_size, namespace)
+    ]
 
-def delete_flashcard(palabra: str):
+@metrics.timer("update.total")
+def update_flashcards(flashcards: list, namespace: str = None) -> int:
     """
-    Elimina una flashcard de la base de datos.
+    Actualiza la traducción y el ejemplo de flashcards que ya existen en el mazo (buscadas por palabra).
+
+    Solo se recalcula el embedding de las que cambian; las que no existen se ignoran.
+
+    Returns:
+        Número de flashcards actualizadas
     """
-    embeddings_function = OpenAIEmbeddings(model="text-embedding-3-small")
+    namespace = normalize_namespace(namespace)
+    _ensure_card_store()
+    deck = _deck_state(namespace)
+    cards = {_card_id(flashcard["palabra"], namespace): flashcard for flashcard in flashcards}
+    if not cards:
+        return 0
 
-    vectorstore = Chroma(
-        persist_directory="data/chroma_db",
-        embedding_function=embeddings_function,
-        collection_name="flashcards"
-    )
+    with deck["write_lock"]:
+        with metrics.timer("update.read"):
+            existing = card_store.get(cards, deck=namespace or "")
+
+        ids, documents, metadatas = [], [], []
+        for u_id, metadata in existing.items():
+            flashcard = cards[u_id]
+            if metadata["traduccion"] == flashcard["traduccion"] and metadata["ejemplo_fr"] == flashcard["ejemplo_fr"]:
+                continue
+            ids.append(u_id)
+            documents.append(f"{flashcard['palabra'].strip().lower()}\n{flashcard['traduccion'].strip().lower()}")
+            metadatas.append({**metadata, "traduccion": flashcard["traduccion"], "ejemplo_fr": flashcard["ejemplo_fr"]})
+
+        if ids:
+            # La traducción cambia el texto del embedding: se recalcula antes de tocar nada
+            vectorstore = get_vectorstore(namespace)
+            with metrics.timer("update.embed"):
+                vectors = vectorstore.embeddings.embed_documents(documents)
+            # Como al guardar: primero el card_store y, si Chroma falla, se le devuelven los valores anteriores
+            with metrics.timer("update.write"):
+                card_store.update(metadatas, deck=namespace or "")
+                try:
+                    vectorstore._collection.update(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+                except Exception:
+                    card_store.update([existing[u_id] for u_id in ids], deck=namespace or "")
+                    raise
+            print(f"✅ Actualizadas {len(ids)} flashcards")
+    return len(ids)
+
+@metrics.timer("manage.page")
+def get_flashcards_page(limit: int = 50, offset: int = 0, prefix: str = None, contains: str = None,
+                        namespace: str = None) -> dict:
+    """
+    Obtiene una página de flashcards del card_store (consultas indexadas, sin Chroma).
+
+    Args:
+        limit: Tamaño de la página.
+        offset: Cuántas flashcards saltar.
+        prefix: Solo palabras que empiezan por este texto (sin distinguir acentos ni mayúsculas).
+        contains: Solo flashcards cuya palabra o traducción contienen este texto.
+        namespace: Mazo ("usuario/mazo"); None es el mazo por defecto.
+
+    Returns:
+        Dict con flashcards (id, palabra, traduccion, ejemplo_fr) y total (flashcards que cumplen el filtro)
+    """
+    _ensure_card_store()
+    deck = normalize_namespace(namespace) or ""
+    flashcards = [
+        {"id": card["id"], "palabra": card["palabra"], "traduccion": card["traduccion"], "ejemplo_fr": card["ejemplo_fr"]}
+        for card in card_store.page(deck=deck, limit=limit, offset=offset, prefix=prefix, contains=contains)
+    ]
+    return {"flashcards": flashcards, "total": card_store.count(deck=deck, prefix=prefix, contains=contains)}
+
+def get_flashcard_ids(prefix: str = None, contains: str = None, namespace: str = None) -> list:
+    """
+    Devuelve los ids de todas las flashcards del mazo que cumplen el filtro (el mismo que
+    get_flashcards_page), sin leer sus datos.
+    """
+    _ensure_card_store()
+    return card_store.ids(deck=normalize_namespace(namespace) or "", prefix=prefix, contains=contains)
+
+@metrics.timer("delete.total")
+def delete_flashcards(ids: list, namespace: str = None) -> int:
+    """
+    Elimina varias flashcards del mazo de una vez: una llamada a Chroma por cada `DELETE_BATCH_SIZE`
+    ids para quitar sus embeddings (no hace falta API key) y una transacción en el card_store y
+    otra en el planificador de repasos.
+
+    Chroma va primero: si falla, el card_store y los repasos quedan intactos y el borrado se puede
+    repetir, en lugar de dejar embeddings de flashcards que ya no existen (que seguirían contando
+    como casi-duplicados).
+
+    Returns:
+        Número de flashcards eliminadas (los ids que no existían no cuentan)
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return 0
+    namespace = normalize_namespace(namespace)
+    _ensure_card_store()
+    deck = _deck_state(namespace)
+
+    with deck["write_lock"]:
+        with metrics.timer("delete.write"):
+            collection = get_vectorstore(namespace)._collection
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                collection.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+        with metrics.timer("delete.card_store"):
+            deleted = card_store.delete(ids, deck=namespace or "")
+        with metrics.timer("delete.review_state"):
+            review_scheduler.remove_cards(ids)
+
+    print(f"✅ Eliminadas {deleted} flashcards")
+    return deleted
+
+def delete_flashcard(palabra: str, namespace: str = None):
+    """
+    Elimina una flashcard del mazo.
+    """
+    # El ID de la flashcard es determinístico
+    namespace = normalize_namespace(namespace)
+    delete_flashcards([_card_id(palabra, namespace)], namespace)
+
+def _build_word_index(namespace: str = None):
+    deck = _deck_state(namespace)
+    index = deck["word_index"]
+    with deck["index_lock"]:
+        if not index.ready:
+            # La versión se lee antes que las flashcards: lo que se escriba mientras tanto llega con apply()
+            version = deck_version(namespace)
+            with metrics.timer("word_index.build"):
+                index.build(iter_flashcards(5000, namespace), version)
+            print(f"✅ Índice de palabras listo: {len(index)} flashcards")
+
+def _sync_word_index(namespace: str, index: WordIndex):
+    # Aplica los cambios del mazo desde la versión del índice; si el registro ya no llega tan atrás, lo vacía
+    version = card_store.version(namespace or "")
+    if version == index.version:
+        return
+    with metrics.timer("word_index.sync"):
+        changes = card_store.changes(index.version, namespace or "")
+        if changes is None:
+            index.clear()
+        else:
+            index.apply(changes)
+
+def load_word_index(namespace: str = None, wait: bool = True) -> WordIndex:
+    """
+    Devuelve el índice de palabras del mazo, construyéndolo desde el card_store la primera vez.
+
+    Es uno por mazo y proceso, compartido por todas las sesiones. Antes de devolverlo se le
+    aplican las flashcards agregadas, editadas o borradas desde su versión (también por otros
+    procesos), sin volver a leer el mazo. Con `wait=False` la primera construcción sigue en un
+    hilo aparte y el índice se devuelve aunque aún no esté listo.
+    """
+    namespace = normalize_namespace(namespace)
+    deck = _deck_state(namespace)
+    if deck["word_index"].ready:
+        _sync_word_index(namespace, deck["word_index"])
+    if not deck["word_index"].ready:
+        if wait:
+            _build_word_index(namespace)
+        elif deck["index_thread"] is None or not deck["index_thread"].is_alive():
+            deck["index_thread"] = threading.Thread(
+                target=_build_word_index, args=(namespace,), name="flashcards-word-index", daemon=True
+            )
+            deck["index_thread"].start()
+    return deck["word_index"]
+
+def find_in_deck(palabra: str, namespace: str = None):
+    """
+    Busca una palabra en el mazo sin llamar al modelo: igual (sin acentos ni mayúsculas) o una
+    variante (con o sin artículo, singular/plural).
+
+    Mientras el índice se construye solo se detecta la palabra exacta, con una consulta por id.
+
+    Returns:
+        Dict {"id", "palabra", "traduccion", "match": "exact" | "variant"} o None si no está
+    """
+    namespace = normalize_namespace(namespace)
+    index = load_word_index(namespace, wait=False)
+    if index.ready:
+        return index.lookup(palabra)
+    u_id = _card_id(palabra, namespace)
+    _ensure_card_store()
+    card = card_store.get([u_id], deck=namespace or "").get(u_id)
+    if card is None:
+        return None
+    return {"id": u_id, "palabra": card["palabra"], "traduccion": card["traduccion"], "match": "exact"}
+
+def suggest_words(prefix: str, limit: int = 8, namespace: str = None) -> list:
+    """
+    Sugerencias del mazo mientras se escribe: flashcards cuya palabra o traducción empieza por `prefix`.
 
-    # Generamos el ID de la flashcard a eliminar (determinístico)
-    u_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, palabra.strip().lower()))
+    Devuelve una lista vacía hasta que el índice termina de construirse.
+    """
+    index = load_word_index(namespace, wait=False)
+    return index.suggest(prefix, limit) if index.ready else []
+
+def _ensure_review_state(namespace: str = None):
+    # Primero la copia desde Chroma: sin ella las flashcards antiguas no están en el card_store y
+    # get_due_flashcards tomaría sus filas de repaso por huérfanas
+    _ensure_card_store()
+    # Las flashcards guardadas antes de existir el planificador se registran una sola vez. La marca
+    # cambió de nombre ("backfilled:" antes): en las bases donde se borraron filas de repaso porque
+    # el registro corrió antes de la copia, las flashcards que se quedaron sin estado vuelven a la cola
+    marker = f"review_backfilled:{os.path.abspath(_store_config['persist_directory'])}:{_collection_name(namespace)}"
+    if review_scheduler.get_meta(marker):
+        return
+    review_scheduler.add_cards(card_store.ids(deck=namespace or ""), deck=namespace or "")
+    review_scheduler.set_meta(marker, datetime.now().isoformat())
+
+def get_due_flashcards(limit: int = STUDY_SESSION_SIZE, namespace: str = None) -> list:
+    """
+    Obtiene las siguientes `limit` flashcards del mazo pendientes de repaso, las más atrasadas primero.
+    """
+    namespace = normalize_namespace(namespace)
+    _ensure_review_state(namespace)
+    due_ids = review_scheduler.due_cards(limit, deck=namespace or "")
+    if not due_ids:
+        return []
+
+    by_id = card_store.get(due_ids, deck=namespace or "")
 
-    # Eliminamos la flashcard
-    vectorstore.delete(ids=[u_id])
+    # Ids que ya no existen en el mazo (borrados desde otro proceso): los quitamos de la cola. Solo
+    # con la copia desde Chroma hecha, para no tomar por borradas las flashcards que aún no se copiaron
+    stale = [u_id for u_id in due_ids if u_id not in by_id]
+    if stale and _cards_migrated:
+        review_scheduler.remove_cards(stale)
 
-    print(f"✅ Flashcard eliminada: {palabra}")
+    return [
+        {
+            "id": u_id,
+            "palabra": by_id[u_id]["palabra"],
+            "traduccion": by_id[u_id]["traduccion"],
+            "ejemplo_fr": by_id[u_id]["ejemplo_fr"]
+        }
+        for u_id in due_ids if u_id in by_id
+    ]
 
-def ai_generate_flashcard(palabra: str):
+def count_due_flashcards(namespace: str = None) -> int:
+    """
+    Devuelve cuántas flashcards del mazo tocan repasar ahora (consulta indexada, sin leer la colección).
+    """
+    namespace = normalize_namespace(namespace)
+    _ensure_review_state(namespace)
+    return review_scheduler.count_due(deck=namespace or "")
+
+def review_flashcard(card_id: str, grade: str, namespace: str = None) -> dict:
+    """
+    Registra la respuesta del estudiante ("again", "hard", "good" o "easy") y programa el siguiente repaso.
+    """
+    return review_scheduler.review(card_id, grade, deck=normalize_namespace(namespace) or "")
+
+def _word_cache_key(palabra: str) -> str:
+    return make_key("ai_generate_flashcard", LLM_MODEL, PROMPT_VERSION, normalize_word(palabra))
+
+@metrics.timer("generate.total")
+def ai_generate_flashcard(palabra: str, use_cache: bool = True):
     """
     Genera una flashcard para una palabra específica.
+
+    Las respuestas se cachean por palabra normalizada; `use_cache=False` fuerza una llamada nueva.
     """
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0,
-        model_kwargs={"response_format": {"type": "json_object"}}
-    )
+    cache_key = _word_cache_key(palabra)
+    with metrics.timer("generate.cache"):
+        cached = _cache_get(cache_key, use_cache)
+    if cached is not None:
+        return cached
+
+    from langchain_core.messages import HumanMessage, SystemMessage
 
     system_message = SystemMessage(
         content=(
@@ -207,18 +1249,227 @@ def ai_generate_flashcard(palabra: str):
         )
     )
 
-    response = llm.invoke([system_message, human_message])
+    messages = [system_message, human_message]
+    with metrics.timer("generate.llm"):
+        response = llm_scheduler.call(
+            lambda: _json_llm().invoke(messages), tokens=estimate_tokens(messages, TOKENS_PER_CARD),
+            key=cache_key, usage=_used_tokens,
+        )
+    _record_usage(response)
     
-    # Parseamos la respuesta
-    try:
-        return json.loads(response.content)
-    except json.JSONDecodeError:
-        return {"error": "El modelo no devolvió un JSON válido", "raw": response.content}
+    with metrics.timer("generate.parse"):
+        result = _parse_flashcards_response(response.content)
+    _cache_set(cache_key, result, use_cache)
+    return result
+
+def parse_word_list(text: str) -> list:
+    """
+    Convierte un texto pegado o un archivo (una palabra por línea, o separadas por comas,
+    punto y coma o tabuladores) en una lista de palabras sin repetidos.
+    """
+    words = {}
+    for line in text.splitlines():
+        if line.lstrip().startswith("#"):
+            continue
+        for word in re.split(r"[,;\t]", line):
+            word = word.strip()
+            if word and normalize_word(word) not in words:
+                words[normalize_word(word)] = word
+    return list(words.values())
+
+def _valid_flashcard(flashcard) -> bool:
+    return isinstance(flashcard, dict) and all(
+        isinstance(flashcard.get(field), str) and flashcard[field].strip()
+        for field in ("palabra", "traduccion", "ejemplo_fr")
+    )
+
+def _cache_word_flashcards(flashcards: list, use_cache: bool):
+    # Cada flashcard se guarda bajo la clave de su palabra, igual que en ai_generate_flashcard
+    for flashcard in flashcards:
+        _cache_set(_word_cache_key(flashcard["palabra"]), {"flashcards": [flashcard]}, use_cache)
+
+async def _agenerate_chunk(words: list) -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    # Una sola llamada para varias palabras; devuelve las flashcards tal como las manda el modelo
+    system_message = SystemMessage(
+        content=(
+            "Eres un asistente experto en aprendizaje de francés. "
+            "Recibirás una lista de palabras o frases en francés, una por línea. "
+            "Genera exactamente una flashcard por cada una, en el mismo orden, copiando la palabra tal cual en el campo palabra. "
+            "Para cada palabra, genera su traducción al español y un ejemplo de uso en francés. "
+            "Responde exclusivamente en formato JSON con esta estructura: "
+            "{\"flashcards\": [{\"palabra\": \"...\", \"traduccion\": \"...\", \"ejemplo_fr\": \"...\"}]}"
+        )
+    )
+    human_message = HumanMessage(content="Genera las flashcards para estas palabras:\n" + "\n".join(words))
+
+    messages = [system_message, human_message]
+    with metrics.timer("generate_bulk.llm"):
+        response = await llm_scheduler.acall(
+            lambda: _json_llm().ainvoke(messages), tokens=estimate_tokens(messages, len(words) * TOKENS_PER_CARD),
+            priority=BULK, key=make_key("generate_bulk", LLM_MODEL, PROMPT_VERSION, *words), usage=_used_tokens,
+        )
+    _record_usage(response)
+    result = _parse_flashcards_response(response.content)
+    flashcards = result.get("flashcards")
+    return flashcards if isinstance(flashcards, list) else []
+
+async def agenerate_flashcards_bulk(words: list, chunk_size: int = BULK_CHUNK_SIZE, max_concurrency: int = MAX_CONCURRENCY,
+                                    max_retries: int = 2, use_cache: bool = True, on_result=None) -> dict:
+    """
+    Versión asíncrona de `ai_generate_flashcards_bulk`.
+    """
+    words = parse_word_list("\n".join(words))
+    found = {}
+
+    # Primero la caché (compartida con ai_generate_flashcard)
+    if use_cache and not CACHE_DISABLED:
+        keys = {_word_cache_key(word): word for word in words}
+        cached = await asyncio.to_thread(response_cache.get_many, list(keys))
+        for key, value in cached.items():
+            flashcards = json.loads(value).get("flashcards") or []
+            if flashcards and _valid_flashcard(flashcards[0]):
+                found[normalize_word(keys[key])] = flashcards[0]
+        if found and on_result is not None:
+            on_result(list(found.values()))
+
+    pending_words = [word for word in words if normalize_word(word) not in found]
+    chunks = [pending_words[i:i + chunk_size] for i in range(0, len(pending_words), chunk_size)]
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    calls = 0
+
+    async def run(chunk):
+        nonlocal calls
+        pending = {normalize_word(word): word for word in chunk}
+        # Reintentamos solo con las palabras que faltan o vinieron mal formadas
+        for _ in range(max_retries + 1):
+            if not pending:
+                break
+            async with semaphore:
+                calls += 1
+                try:
+                    flashcards = await _agenerate_chunk(list(pending.values()))
+                except Exception as e:
+                    print(f"⚠️ Falló un bloque de {len(pending)} palabras: {e}")
+                    continue
+            new_cards = []
+            for flashcard in flashcards:
+                if not _valid_flashcard(flashcard):
+                    continue
+                key = normalize_word(flashcard["palabra"])
+                if key in pending:
+                    flashcard = {**flashcard, "palabra": pending.pop(key)}
+                    found[key] = flashcard
+                    new_cards.append(flashcard)
+            if new_cards:
+                await asyncio.to_thread(_cache_word_flashcards, new_cards, use_cache)
+                if on_result is not None:
+                    on_result(new_cards)
+
+    await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+    return {
+        "flashcards": [found[normalize_word(word)] for word in words if normalize_word(word) in found],
+        "missing": [word for word in words if normalize_word(word) not in found],
+        "calls": calls,
+    }
+
+def ai_generate_flashcards_bulk(words: list, chunk_size: int = BULK_CHUNK_SIZE, max_concurrency: int = MAX_CONCURRENCY,
+                                max_retries: int = 2, use_cache: bool = True, on_result=None) -> dict:
+    """
+    Genera flashcards para muchas palabras agrupándolas en prompts de `chunk_size` palabras,
+    con varios bloques en paralelo.
+
+    Args:
+        words: Lista de palabras (se eliminan repetidas).
+        chunk_size: Palabras por llamada al modelo.
+        max_concurrency: Máximo de llamadas simultáneas.
+        max_retries: Veces que se vuelve a pedir las palabras que faltan o llegaron mal formadas.
+        use_cache: Reutiliza (y guarda) las flashcards ya generadas para cada palabra.
+        on_result: Callback opcional on_result(flashcards) con cada grupo nuevo de flashcards.
+
+    Returns:
+        Dict con flashcards (en el orden de entrada), missing (palabras sin flashcard) y calls (llamadas hechas)
+    """
+    return _run_async(agenerate_flashcards_bulk(
+        words, chunk_size=chunk_size, max_concurrency=max_concurrency,
+        max_retries=max_retries, use_cache=use_cache, on_result=on_result,
+    ))
+
+def _extraction_job(report, image_bytes: bytes, crop_highlights: bool = False) -> dict:
+    flashcards = []
+    for flashcard in image_to_text_stream(image_bytes, crop_highlights=crop_highlights):
+        flashcards.append(flashcard)
+        report(partial=[flashcard])
+    return {"flashcards": flashcards}
+
+def _batch_extraction_job(report, images: list, max_concurrency: int = MAX_CONCURRENCY, crop_highlights: bool = False) -> dict:
+    report(done=0, total=len(images))
+    finished = []
+
+    def on_result(index, result):
+        finished.append(index)
+        report(partial=result.get("flashcards", []), done=len(finished))
+
+    # Un lote de imágenes cede el turno a las extracciones y generaciones de una sola pieza
+    with lane(BULK):
+        return extract_images(images, max_concurrency=max_concurrency, on_result=on_result, crop_highlights=crop_highlights)
+
+def _generation_job(report, palabra: str) -> dict:
+    result = ai_generate_flashcard(palabra)
+    if "error" in result:
+        raise ValueError(result["error"])
+    return result
+
+def _bulk_generation_job(report, words: list) -> dict:
+    report(done=0, total=len(words))
+    generated = []
+
+    def on_result(flashcards):
+        generated.extend(flashcards)
+        report(partial=flashcards, done=len(generated))
+
+    return ai_generate_flashcards_bulk(words, on_result=on_result)
+
+def submit_extraction_job(image_bytes: bytes, crop_highlights: bool = False) -> str:
+    """
+    Encola la extracción de una imagen (en memoria) y devuelve el id del trabajo.
+    """
+    return job_queue.submit("extract", _extraction_job, image_bytes, crop_highlights=crop_highlights)
+
+def submit_batch_extraction_job(images: list, max_concurrency: int = MAX_CONCURRENCY, crop_highlights: bool = False) -> str:
+    """
+    Encola la extracción de varias imágenes y devuelve el id del trabajo.
+    """
+    return job_queue.submit(
+        "extract_batch", _batch_extraction_job, images, max_concurrency=max_concurrency, crop_highlights=crop_highlights
+    )
+
+def submit_generation_job(palabra: str) -> str:
+    """
+    Encola la generación de una flashcard y devuelve el id del trabajo.
+    """
+    return job_queue.submit("generate", _generation_job, palabra)
+
+def submit_bulk_generation_job(words: list) -> str:
+    """
+    Encola la generación de flashcards para una lista de palabras y devuelve el id del trabajo.
+    """
+    return job_queue.submit("generate_bulk", _bulk_generation_job, words)
+
+def get_job(job_id: str) -> dict:
+    """
+    Devuelve el estado de un trabajo (queued, running, done o failed), su resultado y su progreso.
+    """
+    return job_queue.get(job_id)
 
 
 if __name__ == "__main__":
-    # Usamos la imagen de prueba
-    test_image = r"data\image0.jpeg"
+    import sys
+
+    # Imagen de prueba: la que se pase por argumento o la de ejemplo en data/
+    test_image = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "image0.jpeg")
     print(f"--- Procesando imagen: {test_image} ---")
     
     try:
@@ -226,7 +1477,7 @@ if __name__ == "__main__":
         print(json.dumps(resultado, indent=4, ensure_ascii=False))
     except Exception as e:
         print(f"Ocurrió un error: {e}")
+        sys.exit(1)
     
     # Guardamos las flashcards en la base de datos
     print(save_flashcards_to_db(resultado))
-    
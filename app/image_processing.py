@@ -0,0 +1,186 @@
+import io
+import math
+import os
+from collections import deque
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Lado máximo de la imagen enviada al modelo y calidad JPEG de la recompresión
+MAX_SIDE = int(os.getenv("FLASHCARDS_IMAGE_MAX_SIDE", "1600"))
+JPEG_QUALITY = int(os.getenv("FLASHCARDS_IMAGE_QUALITY", "85"))
+
+# Umbrales (0-255, espacio HSV) para reconocer tinta de marcador fluorescente
+HIGHLIGHT_MIN_SATURATION = 90
+HIGHLIGHT_MIN_VALUE = 150
+# Resolución de la rejilla donde se buscan las regiones resaltadas
+DETECTION_GRID = 160
+# Si más de esta fracción de la página parece resaltada, se envía la página completa
+MAX_HIGHLIGHT_COVERAGE = 0.35
+
+_MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def detect_mime_type(image_bytes: bytes) -> str:
+    """
+    Detecta el tipo MIME a partir de los primeros bytes (por defecto image/jpeg).
+    """
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if image_bytes.startswith(magic):
+            return mime_type
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Estima los tokens de imagen de OpenAI en modo "high detail" (85 + 170 por tesela de 512 px).
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def preprocess_image(image_bytes: bytes, max_side: int = MAX_SIDE, crop_highlights: bool = False) -> dict:
+    """
+    Prepara una imagen para la llamada de visión: corrige la rotación EXIF, limita la
+    resolución y la recomprime como JPEG.
+
+    Args:
+        image_bytes: Bytes del archivo subido (JPEG, PNG, ...).
+        max_side: Lado máximo en píxeles tras el redimensionado.
+        crop_highlights: Si es True, envía solo recortes alrededor de las zonas resaltadas
+            con marcador (si no se detecta ninguna, se envía la página completa).
+
+    Returns:
+        Dict con data (bytes), mime_type, width, height y regions (recortes usados, 0 = página completa)
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # En JPEG decodificamos directamente a escala reducida (mucho más rápido que a 12 MP)
+        scale = min(1.0, max_side / max(image.size))
+        image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+    except Exception:
+        # No es una imagen que Pillow entienda: la mandamos tal cual con su tipo real
+        return {"data": image_bytes, "mime_type": detect_mime_type(image_bytes), "width": None, "height": None, "regions": 0}
+
+    image = _to_rgb(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    regions = 0
+    if crop_highlights:
+        boxes = find_highlight_boxes(image)
+        if boxes:
+            image = _stack_crops(image, boxes)
+            regions = len(boxes)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return {
+        "data": buffer.getvalue(),
+        "mime_type": "image/jpeg",
+        "width": image.width,
+        "height": image.height,
+        "regions": regions,
+    }
+
+
+def find_highlight_boxes(image: Image.Image, padding: float = 0.015) -> list:
+    """
+    Devuelve las cajas (left, top, right, bottom) de las zonas pintadas con marcador fluorescente.
+
+    Se trabaja sobre una rejilla reducida: máscara de color (saturación y brillo altos),
+    dilatación para unir letras de una misma línea y componentes conexas.
+    """
+    small = image.copy()
+    small.thumbnail((DETECTION_GRID, DETECTION_GRID), Image.BOX)
+    _, saturation, value = small.convert("HSV").split()
+    mask = ImageChops.multiply(
+        saturation.point(lambda x: 255 if x >= HIGHLIGHT_MIN_SATURATION else 0),
+        value.point(lambda x: 255 if x >= HIGHLIGHT_MIN_VALUE else 0),
+    )
+    grid_w, grid_h = mask.size
+    pixels = mask.tobytes()
+    coverage = sum(1 for p in pixels if p) / len(pixels)
+    if coverage == 0 or coverage > MAX_HIGHLIGHT_COVERAGE:
+        return []
+
+    dilated = mask.filter(ImageFilter.MaxFilter(3)).tobytes()
+    seen = bytearray(len(dilated))
+    min_cells = max(2, (grid_w * grid_h) // 4000)
+    scale_x, scale_y = image.width / grid_w, image.height / grid_h
+    pad_x, pad_y = int(image.width * padding), int(image.height * padding)
+
+    boxes = []
+    for start, filled in enumerate(dilated):
+        if not filled or seen[start]:
+            continue
+        # Recorrido en anchura de la componente conexa
+        seen[start] = 1
+        queue = deque([start])
+        cells = 0
+        x0, y0, x1, y1 = grid_w, grid_h, 0, 0
+        while queue:
+            idx = queue.popleft()
+            y, x = divmod(idx, grid_w)
+            cells += 1
+            x0, y0, x1, y1 = min(x0, x), min(y0, y), max(x1, x), max(y1, y)
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < grid_w and 0 <= ny < grid_h:
+                    n = ny * grid_w + nx
+                    if dilated[n] and not seen[n]:
+                        seen[n] = 1
+                        queue.append(n)
+        if cells < min_cells:
+            continue
+        boxes.append((
+            max(0, int(x0 * scale_x) - pad_x),
+            max(0, int(y0 * scale_y) - pad_y),
+            min(image.width, int((x1 + 1) * scale_x) + pad_x),
+            min(image.height, int((y1 + 1) * scale_y) + pad_y),
+        ))
+    return _merge_boxes(boxes)
+
+
+def _merge_boxes(boxes: list) -> list:
+    # Fusiona cajas que se solapan (el padding puede hacer que dos líneas se toquen)
+    merged = []
+    for box in sorted(boxes, key=lambda b: (b[1], b[0])):
+        for i, other in enumerate(merged):
+            if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                merged[i] = (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+                break
+        else:
+            merged.append(box)
+    return merged
+
+
+def _stack_crops(image: Image.Image, boxes: list, gap: int = 12) -> Image.Image:
+    # Apila los recortes verticalmente en una sola imagen (una sola imagen = menos tokens)
+    crops = [image.crop(box) for box in boxes]
+    width = max(c.width for c in crops)
+    height = sum(c.height for c in crops) + gap * (len(crops) - 1)
+    sheet = Image.new("RGB", (width, height), "white")
+    y = 0
+    for crop in crops:
+        sheet.paste(crop, (0, y))
+        y += crop.height + gap
+    return sheet
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    # JPEG no admite transparencia: aplanamos sobre fondo blanco
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert("RGB")
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Cada cuánto marca el proceso sus trabajos en curso como vivos, y tras cuánto sin marca se dan por perdidos
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 60
+# Los trabajos terminados se borran pasado este tiempo (el resultado completo va en la fila)
+MAX_AGE = 7 * 24 * 3600
+
+
+class JobQueue:
+    """
+    Cola de trabajos en segundo plano con un pool de hilos.
+
+    Cada trabajo recibe un id y pasa por queued -> running -> done/failed. El estado y el
+    resultado se guardan en SQLite; el progreso parcial (por ejemplo, las flashcards que
+    ya llegaron) se mantiene en memoria mientras el trabajo corre.
+
+    Varios procesos pueden compartir el archivo. Mientras un proceso tiene trabajos sin
+    terminar, un hilo renueva su `heartbeat_at`; al abrir la cola solo se dan por
+    interrumpidos los que llevan más de HEARTBEAT_TIMEOUT segundos sin renovarse (su proceso
+    ya no existe), nunca los que otro proceso sigue ejecutando.
+
+    Args:
+        path: Archivo SQLite donde se guardan los trabajos.
+        max_workers: Trabajos que se ejecutan a la vez.
+    """
+
+    def __init__(self, path: str, max_workers: int = 4):
+        self.path = path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._conn = None
+        self._executor = None
+        self._progress = {}
+        self._heartbeat = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, heartbeat_at REAL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "heartbeat_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at)")
+            now = time.time()
+            # Los que quedaron a medias en un proceso que ya no está no van a terminar; los de otros
+            # procesos vivos siguen renovando su marca
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status IN (?, ?) AND COALESCE(heartbeat_at, updated_at) < ?",
+                (FAILED, "Interrumpido por un reinicio", now, QUEUED, RUNNING, now - HEARTBEAT_TIMEOUT),
+            )
+            self._prune(conn, MAX_AGE)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _beat(self):
+        # Renueva la marca de los trabajos sin terminar de este proceso; se para cuando no queda ninguno
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                job_ids = list(self._progress)
+                if not job_ids or self._conn is None:
+                    self._heartbeat = None
+                    return
+                self._conn.executemany(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(time.time(), job_id) for job_id in job_ids]
+                )
+                self._conn.commit()
+
+    def _update(self, job_id: str, status: str, result=None, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, None if result is None else json.dumps(result, ensure_ascii=False), error, time.time(), job_id),
+            )
+            conn.commit()
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> str:
+        """
+        Encola fn(report, *args, **kwargs) y devuelve el id del trabajo.
+
+        `report(partial=None, done=None, total=None)` permite publicar progreso parcial.
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created_at, updated_at, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, now, now, now),
+            )
+            conn.commit()
+            self._progress[job_id] = {"partial": [], "done": 0, "total": None}
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="flashcards-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="flashcards-job")
+            executor = self._executor
+        executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs):
+        progress = self._progress[job_id]
+
+        def report(partial=None, done=None, total=None):
+            if partial:
+                progress["partial"].extend(partial)
+            if done is not None:
+                progress["done"] = done
+            if total is not None:
+                progress["total"] = total
+
+        self._update(job_id, RUNNING)
+        try:
+            result = fn(report, *args, **kwargs)
+        except Exception as e:
+            self._update(job_id, FAILED, error=str(e) or type(e).__name__)
+        else:
+            self._update(job_id, DONE, result=result)
+        finally:
+            self._progress.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Devuelve el estado del trabajo: id, kind, status, result, error y, mientras corre,
+        partial/done/total con el progreso publicado.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, kind, status, result, error, created_at, updated_at, heartbeat_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, error = row[2], row[4]
+        # Un trabajo de otro proceso que dejó de renovar su marca no va a terminar
+        if status in (QUEUED, RUNNING) and job_id not in self._progress and (row[7] or row[6]) < time.time() - HEARTBEAT_TIMEOUT:
+            status, error = FAILED, "Interrumpido por un reinicio"
+        job = {
+            "id": row[0],
+            "kind": row[1],
+            "status": status,
+            "result": json.loads(row[3]) if row[3] is not None else None,
+            "error": error,
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+        progress = self._progress.get(job_id)
+        if progress is not None:
+            job.update(partial=list(progress["partial"]), done=progress["done"], total=progress["total"])
+        return job
+
+    def prune(self, max_age: float = MAX_AGE):
+        """
+        Borra los trabajos terminados hace más de `max_age` segundos (se hace también al abrir la cola).
+        """
+        with self._lock:
+            conn = self._connect()
+            self._prune(conn, max_age)
+            conn.commit()
+
+    def _prune(self, conn: sqlite3.Connection, max_age: float):
+        conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, time.time() - max_age))
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,456 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Carriles de prioridad: el número más bajo pasa primero
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# Códigos HTTP que vale la pena reintentar (límite de uso, conflicto o fallo del servidor)
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+# Errores sin código HTTP (conexión cortada, timeout) del SDK de OpenAI y de httpx
+RETRYABLE_ERRORS = ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadError", "ReadTimeout",
+                    "RemoteProtocolError", "PoolTimeout")
+# Tokens que cuenta una imagen antes de saber el uso real (se corrige con la respuesta)
+IMAGE_TOKENS = 1000
+
+_lane = contextvars.ContextVar("flashcards_llm_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def lane(priority: int):
+    """
+    Hace que las llamadas de este bloque (también las de corrutinas e hilos lanzados desde él
+    con asyncio) vayan por el carril `priority` si no indican otro.
+    """
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Indica si un error de la API es pasajero (429, 5xx, conexión) y tiene sentido reintentar.
+    """
+    # Sin saldo también es un 429, pero reintentar no lo arregla
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Segundos de espera que pide el servidor en las cabeceras retry-after-ms o retry-after.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            value = float(headers.get(header))
+        except (TypeError, ValueError):
+            continue
+        if value >= 0:
+            return value * scale
+    return None
+
+
+def estimate_tokens(messages, completion_tokens: int = 0) -> int:
+    """
+    Estima los tokens de una petición de chat: ~4 caracteres por token de texto, IMAGE_TOKENS por
+    imagen y los `completion_tokens` que se esperan de respuesta.
+    """
+    tokens = completion_tokens
+    for message in messages:
+        content = getattr(message, "content", message)
+        parts = [content] if isinstance(content, str) else content
+        for part in parts:
+            if isinstance(part, str):
+                tokens += len(part) // 4 + 1
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // 4 + 1
+    return tokens
+
+
+class TokenBucket:
+    """
+    Cubeta que se rellena a `per_minute` unidades por minuto y acumula como mucho lo de
+    `burst_seconds` segundos (OpenAI reparte el límite por minuto en ventanas más cortas, así
+    que gastar el minuto entero de golpe también da 429).
+
+    El nivel puede quedar negativo cuando el uso real supera lo estimado; la deuda se paga
+    esperando antes de la siguiente petición. `per_minute=0` desactiva el límite.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # Una petición más grande que la cubeta espera a que esté llena (si no, no pasaría nunca)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.level -= amount
+
+
+class _Flight:
+    # Una llamada en curso a la que se suman las peticiones idénticas que llegan mientras tanto
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.done = False
+        self.chunks = []
+        self.result = None
+        self.error = None
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, result=None, error: Optional[BaseException] = None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while not self.done:
+                self.cond.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def replay(self) -> Iterator:
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                pending = self.chunks[position:]
+                done = self.done
+            position += len(pending)
+            yield from pending
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class RequestScheduler:
+    """
+    Planificador de las llamadas a una API con límite de uso (chat o embeddings de OpenAI).
+
+    Antes de cada llamada espera a que haya cupo en dos cubetas, peticiones y tokens por minuto,
+    de modo que el proceso no provoque 429. Las peticiones esperan en una cola con prioridad: las
+    del carril INTERACTIVE (una palabra, una imagen) pasan delante de las de BULK (listas de
+    palabras, lotes de imágenes, importaciones) aunque hayan llegado después.
+
+    Los errores pasajeros (429, 5xx, conexión) se reintentan hasta `max_retries` veces con espera
+    exponencial y jitter, o lo que pida el servidor en Retry-After; tras un 429 todo el planificador
+    se pausa ese tiempo, porque el resto de peticiones también lo recibirían.
+
+    Las llamadas con la misma `key` que coinciden en el tiempo se resuelven con una sola petición
+    (single-flight): las que llegan después esperan el resultado de la primera.
+
+    Args:
+        name: Nombre para los mensajes y las métricas ("llm", "embeddings").
+        rpm: Peticiones por minuto (0 = sin límite).
+        tpm: Tokens por minuto (0 = sin límite).
+        max_retries: Reintentos por llamada ante errores pasajeros.
+        base_delay: Espera del primer reintento (se dobla en cada uno).
+        max_delay: Espera máxima entre reintentos.
+        burst_seconds: Segundos de cupo que se pueden gastar de golpe tras estar parado.
+        metrics: Metrics opcional donde registrar la espera en cola y en reintentos.
+    """
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_retries: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 30.0, burst_seconds: float = 10.0, metrics=None):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._requests = TokenBucket(rpm, burst_seconds)
+        self._tokens = TokenBucket(tpm, burst_seconds)
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._flights = {}
+        self._stats = {"calls": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "failed": 0}
+
+    # --- Cola y cubetas ---
+
+    def _admit(self, ticket: tuple, tokens: int) -> float:
+        # Se llama con el lock tomado: 0 si el ticket puede pasar ya (y lo saca de la cola), o segundos de espera
+        if self._waiting[0] != ticket:
+            return 0.25
+        now = time.monotonic()
+        wait = max(self._paused_until - now, self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self._stats["calls"] += 1
+        # El siguiente de la cola puede comprobar si le toca
+        self._cond.notify_all()
+        return 0.0
+
+    def _leave(self, ticket: tuple):
+        # Se llama con el lock tomado si la espera se interrumpe antes de pasar
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _observe_wait(self, priority: int, seconds: float):
+        if self.metrics is not None:
+            self.metrics.observe(f"{self.name}.queue.{LANE_NAMES.get(priority, priority)}", seconds)
+
+    def acquire(self, tokens: int = 0, priority: Optional[int] = None):
+        """
+        Espera (bloqueando el hilo) a que la petición tenga cupo y turno.
+        """
+        priority = _lane.get() if priority is None else priority
+        t0 = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._admit(ticket, tokens)
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._leave(ticket)
+                raise
+        self._observe_wait(priority, time.monotonic() - t0)
+
+    async def aacquire(self, tokens: int = 0, priority: Optional[int] = None):
+        """
+        Como `acquire`, pero cede el bucle de eventos mientras espera.
+        """
+        priority = _lane.get() if priority is None else priority
+        t0 = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._admit(ticket, tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            with self._cond:
+                self._leave(ticket)
+            raise
+        self._observe_wait(priority, time.monotonic() - t0)
+
+    def settle(self, estimated: int, actual: int):
+        """
+        Corrige la cubeta de tokens con el uso real de una llamada (devuelve o cobra la diferencia).
+        """
+        with self._cond:
+            self._tokens.take(actual - estimated)
+            self._cond.notify_all()
+
+    # --- Reintentos ---
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        # Segundos hasta el siguiente intento, o None si no hay que reintentar
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._cond:
+                self._stats["failed"] += 1
+            return None
+        # Full jitter: un valor al azar hasta la espera exponencial, para que los reintentos no coincidan
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        if requested is not None:
+            delay = min(self.max_delay, requested) + random.uniform(0, self.base_delay)
+        with self._cond:
+            self._stats["retries"] += 1
+            if status_code(error) == 429:
+                self._stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        if self.metrics is not None:
+            self.metrics.observe(f"{self.name}.backoff", delay)
+        print(f"⚠️ {self.name}: {type(error).__name__} ({status_code(error) or 'sin código'}), "
+              f"reintento {attempt + 1}/{self.max_retries} en {delay:.1f} s")
+        return delay
+
+    def _settle_usage(self, tokens: int, used: int):
+        if used:
+            self.settle(tokens, used)
+
+    # --- Single-flight ---
+
+    def _join(self, kind: str, key: Optional[str]) -> tuple:
+        # Devuelve (flight, líder); sin key cada llamada va por su cuenta
+        if key is None:
+            return None, True
+        with self._cond:
+            flight = self._flights.get((kind, key))
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                return flight, False
+            flight = self._flights[(kind, key)] = _Flight()
+            return flight, True
+
+    def _land(self, kind: str, key: Optional[str], flight: Optional[_Flight], result=None,
+              error: Optional[BaseException] = None):
+        if flight is None:
+            return
+        with self._cond:
+            self._flights.pop((kind, key), None)
+        if error is not None and not isinstance(error, Exception):
+            # Un hilo interrumpido o un generador cerrado por su consumidor no es un fallo de la API
+            error = RuntimeError(f"La petición compartida se canceló ({type(error).__name__})")
+        flight.finish(result, error)
+
+    # --- Llamadas ---
+
+    def call(self, fn: Callable, tokens: int = 0, priority: Optional[int] = None, key: Optional[str] = None,
+             usage: Optional[Callable] = None):
+        """
+        Ejecuta fn() cuando hay cupo, reintentando los errores pasajeros.
+
+        Args:
+            fn: Función sin argumentos que hace la petición.
+            tokens: Tokens estimados de la petición (para el límite por minuto).
+            priority: INTERACTIVE o BULK; por defecto, el carril activo (ver `lane`).
+            key: Clave de la petición para unir llamadas idénticas simultáneas (None = no unir).
+            usage: Función opcional usage(resultado) con los tokens reales, para corregir la estimación.
+        """
+        flight, leader = self._join("call", key)
+        if not leader:
+            return flight.wait()
+        try:
+            for attempt in itertools.count():
+                self.acquire(tokens, priority)
+                try:
+                    result = fn()
+                    break
+                except Exception as e:
+                    delay = self._backoff(e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+            if usage is not None:
+                self._settle_usage(tokens, usage(result))
+        except BaseException as e:
+            self._land("call", key, flight, error=e)
+            raise
+        self._land("call", key, flight, result)
+        return result
+
+    async def acall(self, fn: Callable, tokens: int = 0, priority: Optional[int] = None, key: Optional[str] = None,
+                    usage: Optional[Callable] = None):
+        """
+        Versión asíncrona de `call`: fn() devuelve un awaitable.
+        """
+        flight, leader = self._join("call", key)
+        if not leader:
+            return await asyncio.to_thread(flight.wait)
+        try:
+            for attempt in itertools.count():
+                await self.aacquire(tokens, priority)
+                try:
+                    result = await fn()
+                    break
+                except Exception as e:
+                    delay = self._backoff(e, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+            if usage is not None:
+                self._settle_usage(tokens, usage(result))
+        except BaseException as e:
+            self._land("call", key, flight, error=e)
+            raise
+        self._land("call", key, flight, result)
+        return result
+
+    def stream(self, fn: Callable, tokens: int = 0, priority: Optional[int] = None, key: Optional[str] = None,
+               usage: Optional[Callable] = None) -> Iterator:
+        """
+        Como `call` para respuestas en streaming: fn() devuelve un iterador de trozos.
+
+        Solo se reintenta si el error llega antes del primer trozo; después se propaga, porque
+        quien consume ya recibió parte de la respuesta. Las llamadas unidas por `key` reciben los
+        mismos trozos a medida que llegan. `usage` se aplica a cada trozo y se suma.
+        """
+        flight, leader = self._join("stream", key)
+        if not leader:
+            yield from flight.replay()
+            return
+        try:
+            used = 0
+            for attempt in itertools.count():
+                self.acquire(tokens, priority)
+                started = False
+                try:
+                    for chunk in fn():
+                        started = True
+                        if usage is not None:
+                            used += usage(chunk) or 0
+                        if flight is not None:
+                            flight.publish(chunk)
+                        yield chunk
+                    break
+                except Exception as e:
+                    delay = None if started else self._backoff(e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+            self._settle_usage(tokens, used)
+        except BaseException as e:
+            self._land("stream", key, flight, error=e)
+            raise
+        self._land("stream", key, flight)
+
+    def stats(self) -> dict:
+        """
+        Devuelve llamadas, reintentos, 429 recibidos, peticiones unidas, fallos y peticiones en cola.
+        """
+        with self._cond:
+            return {**self._stats, "queued": len(self._waiting), "in_flight": len(self._flights)}
+
+    def reset_stats(self):
+        with self._cond:
+            self._stats = dict.fromkeys(self._stats, 0)
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Precio en USD por millón de tokens (entrada, salida); los modelos que no estén aquí cuestan 0
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Límites (segundos) de los buckets del histograma de Prometheus
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """
+    Coste estimado en USD de una llamada según la tabla PRICES.
+    """
+    input_price, output_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Registro en memoria de duraciones por etapa, bytes enviados, tokens y coste de las llamadas.
+
+    Las duraciones se guardan como histograma acumulado (para Prometheus) y además las
+    últimas `window` muestras de cada etapa para calcular p50/p95.
+
+    Args:
+        window: Muestras recientes por etapa usadas para los percentiles.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self._histograms = {}
+            self._bytes = {}
+            self._tokens = {}
+            self._cost = {}
+            self._calls = {}
+            self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Registra la duración de una ejecución de `stage`.
+        """
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._histograms[stage] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            samples.append(seconds)
+            histogram = self._histograms[stage]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Mide el bloque `with` y lo registra como una ejecución de `stage` (también si falla).
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def add_bytes(self, stage: str, size: int):
+        with self._lock:
+            self._bytes[stage] = self._bytes.get(stage, 0) + size
+
+    def record_usage(self, model: str, prompt_tokens: int, completion_tokens: int = 0):
+        """
+        Suma los tokens de una llamada al modelo y su coste estimado.
+        """
+        with self._lock:
+            tokens = self._tokens.setdefault(model, {"prompt": 0, "completion": 0})
+            tokens["prompt"] += prompt_tokens
+            tokens["completion"] += completion_tokens
+            self._calls[model] = self._calls.get(model, 0) + 1
+            self._cost[model] = self._cost.get(model, 0.0) + estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def summary(self) -> dict:
+        """
+        Devuelve un resumen para mostrar: por etapa (count, p50_ms, p95_ms, mean_ms, total_s),
+        bytes por etapa y tokens, llamadas y coste por modelo.
+        """
+        with self._lock:
+            stages = {}
+            for stage, samples in sorted(self._samples.items()):
+                histogram = self._histograms[stage]
+                stages[stage] = {
+                    "count": histogram["count"],
+                    "p50_ms": round(_percentile(samples, 0.50) * 1000, 2),
+                    "p95_ms": round(_percentile(samples, 0.95) * 1000, 2),
+                    "mean_ms": round(histogram["sum"] / histogram["count"] * 1000, 2),
+                    "total_s": round(histogram["sum"], 3),
+                }
+            models = {
+                model: {**tokens, "calls": self._calls[model], "cost_usd": round(self._cost[model], 6)}
+                for model, tokens in sorted(self._tokens.items())
+            }
+            return {
+                "since": self.started_at,
+                "stages": stages,
+                "bytes": dict(sorted(self._bytes.items())),
+                "models": models,
+                "total_cost_usd": round(sum(self._cost.values()), 6),
+            }
+
+    def prometheus_text(self, prefix: str = "flashcards") -> str:
+        """
+        Exporta las métricas en el formato de texto de Prometheus.
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                f"# HELP {prefix}_stage_seconds Duración de cada etapa de procesamiento.",
+                f"# TYPE {prefix}_stage_seconds histogram",
+            ]
+            for stage, histogram in sorted(self._histograms.items()):
+                label = f'stage="{_escape(stage)}"'
+                for bound, count in zip(BUCKETS, histogram["buckets"]):
+                    lines.append(f'{prefix}_stage_seconds_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{label}}} {histogram['sum']:.6f}")
+                lines.append(f"{prefix}_stage_seconds_count{{{label}}} {histogram['count']}")
+
+            lines += [
+                f"# HELP {prefix}_payload_bytes_total Bytes procesados o enviados por etapa.",
+                f"# TYPE {prefix}_payload_bytes_total counter",
+            ]
+            for stage, size in sorted(self._bytes.items()):
+                lines.append(f'{prefix}_payload_bytes_total{{stage="{_escape(stage)}"}} {size}')
+
+            lines += [
+                f"# HELP {prefix}_llm_tokens_total Tokens enviados (prompt) y recibidos (completion) por modelo.",
+                f"# TYPE {prefix}_llm_tokens_total counter",
+            ]
+            for model, tokens in sorted(self._tokens.items()):
+                for kind, count in tokens.items():
+                    lines.append(f'{prefix}_llm_tokens_total{{model="{_escape(model)}",kind="{kind}"}} {count}')
+
+            lines += [
+                f"# HELP {prefix}_llm_calls_total Llamadas al modelo.",
+                f"# TYPE {prefix}_llm_calls_total counter",
+            ]
+            for model, calls in sorted(self._calls.items()):
+                lines.append(f'{prefix}_llm_calls_total{{model="{_escape(model)}"}} {calls}')
+
+            lines += [
+                f"# HELP {prefix}_llm_cost_usd_total Coste estimado en USD.",
+                f"# TYPE {prefix}_llm_cost_usd_total counter",
+            ]
+            for model, cost in sorted(self._cost.items()):
+                lines.append(f'{prefix}_llm_cost_usd_total{{model="{_escape(model)}"}} {cost:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(metrics: Metrics, port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Sirve `metrics.prometheus_text()` en http://host:port/metrics desde un hilo en segundo plano.
+
+    Returns:
+        El servidor, o None si el puerto no está disponible
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        print(f"⚠️ No se pudo abrir el puerto de métricas {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="flashcards-metrics", daemon=True).start()
+    print(f"📈 Métricas en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+DAY = 24 * 3600
+# Tras un "Again" la flashcard vuelve a la cola a los pocos minutos
+RELEARN_DELAY = 10 * 60
+
+# Botones de Study Mode -> calidad de respuesta de SM-2 (0-5)
+GRADES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+
+def sm2(repetitions: int, interval_days: float, ease: float, quality: int):
+    """
+    Aplica un repaso con el algoritmo SM-2.
+
+    Returns:
+        Tupla (repetitions, interval_days, ease) actualizada; interval_days = 0 significa "reaprender ya"
+    """
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, 0.0, ease
+    if repetitions == 0:
+        interval_days = 1.0
+    elif repetitions == 1:
+        interval_days = 6.0
+    else:
+        interval_days = round(interval_days * ease, 2)
+    return repetitions + 1, interval_days, ease
+
+
+class ReviewScheduler:
+    """
+    Estado de repaso por flashcard en SQLite, con índice por fecha de vencimiento.
+
+    Cargar la cola de una sesión lee solo las N siguientes flashcards vencidas y cada
+    repaso actualiza una única fila, sin importar el tamaño del mazo.
+
+    Cada fila lleva el mazo al que pertenece ("" es el mazo por defecto) y el índice es
+    (deck, due_at), así que la cola de un usuario no crece con las de los demás.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS review_state ("
+                "card_id TEXT PRIMARY KEY, due_at REAL NOT NULL, interval_days REAL NOT NULL DEFAULT 0, "
+                "ease REAL NOT NULL DEFAULT 2.5, repetitions INTEGER NOT NULL DEFAULT 0, "
+                "lapses INTEGER NOT NULL DEFAULT 0, last_review REAL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(review_state)")]
+            if "deck" not in columns:
+                # Bases anteriores a los mazos: todo pertenece al mazo por defecto
+                conn.execute("ALTER TABLE review_state ADD COLUMN deck TEXT NOT NULL DEFAULT ''")
+            conn.execute("DROP INDEX IF EXISTS idx_review_due")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_review_deck_due ON review_state(deck, due_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS decks (namespace TEXT PRIMARY KEY, created_at REAL NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add_cards(self, card_ids: Iterable[str], due_at: Optional[float] = None, deck: str = ""):
+        """
+        Registra flashcards nuevas del mazo `deck` (vencen ya); las que ya tienen estado no se tocan.
+        """
+        due_at = time.time() if due_at is None else due_at
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO review_state (card_id, due_at, deck) VALUES (?, ?, ?)",
+                [(card_id, due_at, deck) for card_id in card_ids],
+            )
+            conn.commit()
+
+    def remove_cards(self, card_ids: Iterable[str]):
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM review_state WHERE card_id = ?", [(card_id,) for card_id in card_ids])
+            conn.commit()
+
+    def due_cards(self, limit: int, now: Optional[float] = None, deck: str = "") -> List[str]:
+        """
+        Devuelve los ids de las `limit` flashcards vencidas del mazo que llevan más tiempo esperando.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT card_id FROM review_state WHERE deck = ? AND due_at <= ? ORDER BY due_at LIMIT ?", (deck, now, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count_due(self, now: Optional[float] = None, deck: str = "") -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM review_state WHERE deck = ? AND due_at <= ?", (deck, now)
+            ).fetchone()[0]
+
+    def next_due_at(self, deck: str = "") -> Optional[float]:
+        with self._lock:
+            return self._connect().execute("SELECT MIN(due_at) FROM review_state WHERE deck = ?", (deck,)).fetchone()[0]
+
+    def review(self, card_id: str, grade: str, now: Optional[float] = None, deck: str = "") -> dict:
+        """
+        Registra un repaso ("again", "hard", "good" o "easy") y programa el siguiente.
+
+        Returns:
+            Dict con el nuevo estado (due_at, interval_days, ease, repetitions, lapses)
+        """
+        now = time.time() if now is None else now
+        quality = GRADES[grade]
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT interval_days, ease, repetitions, lapses FROM review_state WHERE card_id = ?", (card_id,)
+            ).fetchone()
+            interval_days, ease, repetitions, lapses = row if row else (0.0, 2.5, 0, 0)
+            repetitions, interval_days, ease = sm2(repetitions, interval_days, ease, quality)
+            if quality < 3:
+                lapses += 1
+            due_at = now + (interval_days * DAY if interval_days else RELEARN_DELAY)
+            # Si la flashcard ya tenía estado conserva su mazo
+            conn.execute(
+                "INSERT INTO review_state (card_id, due_at, interval_days, ease, repetitions, lapses, last_review, deck) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(card_id) DO UPDATE SET due_at = excluded.due_at, "
+                "interval_days = excluded.interval_days, ease = excluded.ease, repetitions = excluded.repetitions, "
+                "lapses = excluded.lapses, last_review = excluded.last_review",
+                (card_id, due_at, interval_days, ease, repetitions, lapses, now, deck),
+            )
+            conn.commit()
+        return {"due_at": due_at, "interval_days": interval_days, "ease": ease, "repetitions": repetitions, "lapses": lapses}
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            conn.commit()
+
+    def register_deck(self, namespace: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR IGNORE INTO decks VALUES (?, ?)", (namespace, time.time()))
+            conn.commit()
+
+    def list_decks(self, prefix: str = "") -> List[str]:
+        """
+        Devuelve los mazos registrados que empiezan por `prefix` (por ejemplo "ana/"), por orden alfabético.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT namespace FROM decks WHERE namespace >= ? AND namespace < ? ORDER BY namespace",
+                (prefix, prefix + "\U0010ffff"),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,69 @@
+import json
+from typing import List
+
+
+class FlashcardStreamParser:
+    """
+    Parser incremental para respuestas {"flashcards": [{...}, {...}]} que llegan por trozos.
+
+    Cada objeto que es elemento directo de una lista se devuelve en cuanto se cierra, sin
+    esperar al resto de la respuesta. Si el flujo se corta, lo ya devuelto sigue siendo válido.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.offset = 0
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.card_start = None
+        self.card_depth = None
+        self.complete = False
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Añade un trozo de texto y devuelve las flashcards que se completaron con él.
+        """
+        cards = []
+        for char in text:
+            self.buffer.append(char)
+            index = self.position
+            self.position += 1
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                # Un objeto cuyo contenedor inmediato es una lista es una flashcard
+                if char == "{" and self.stack and self.stack[-1] == "[" and self.card_start is None:
+                    self.card_start = index
+                    self.card_depth = len(self.stack)
+                self.stack.append(char)
+            elif char in "}]" and self.stack:
+                self.stack.pop()
+                if char == "}" and self.card_start is not None and len(self.stack) == self.card_depth:
+                    card = self._load("".join(self.buffer[self.card_start - self.offset:index - self.offset + 1]))
+                    if isinstance(card, dict):
+                        cards.append(card)
+                    self.card_start = None
+                if not self.stack:
+                    self.complete = True
+
+        # No hace falta conservar el texto anterior a la flashcard en curso
+        if self.card_start is None:
+            self.buffer.clear()
+            self.offset = self.position
+        return cards
+
+    def _load(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
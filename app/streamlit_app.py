@@ -1,6 +1,15 @@
 import streamlit as st
-from functions import image_to_text, save_flashcards_to_db, get_all_flashcards, delete_flashcard, ai_generate_flashcard
-import random
+from functions import (
+    submit_extraction_job, submit_batch_extraction_job, submit_generation_job,
+    submit_bulk_generation_job, get_job, get_llm, list_decks, create_deck, deck_namespace,
+    save_flashcards_to_db, get_flashcards_page, get_due_flashcards, count_due_flashcards,
+    review_flashcard, delete_flashcard, delete_flashcards, update_flashcards, get_flashcard_ids,
+    deck_version, load_word_index, find_in_deck, suggest_words, parse_word_list,
+    find_duplicate_flashcards, get_metrics_summary, metrics_text, reset_metrics, cache_stats,
+    embeddings_cache_stats, scheduler_stats, MAX_CONCURRENCY, NEAR_DUPLICATE_THRESHOLD, ADMIN_PANEL,
+    DEFAULT_DECK,
+)
+from deck_io import submit_import_job, export_deck_bytes, detect_format, FORMATS
 import time
 
 # Page Configuration
@@ -69,12 +78,57 @@ if "show_answer" not in st.session_state:
 if "flashcards_list" not in st.session_state:
     st.session_state.flashcards_list = []
 
+# --- Cached Resources ---
+# Heavy clients are created the first time a view needs them and reused by every rerun and session.
+# Study and Manage read from the card store, so they never open the vector store
+@st.cache_resource(show_spinner="Loading the AI model...")
+def load_ai_client():
+    return get_llm()
+
+def warm_ai_client():
+    # Without credentials the view still renders; the error shows up when a job runs
+    try:
+        load_ai_client()
+    except Exception as e:
+        st.warning(f"AI model unavailable: {e}")
+
 # --- Sidebar Navigation ---
 with st.sidebar:
     st.title("🇫🇷 Flashcards AI")
     st.markdown("*Your AI-powered French learning companion*")
     st.divider()
     
+    # Each user has their own decks: the login email if there is one, otherwise a profile name
+    user = st.user.get("email") if st.user.get("is_logged_in") else st.text_input(
+        "Profile", placeholder="Your name (optional)", key="profile",
+        help="Each profile keeps its own decks. Leave it empty to use the shared deck."
+    )
+    decks = list_decks(user)
+    if st.session_state.get("deck") not in decks:
+        st.session_state.deck = DEFAULT_DECK
+    st.selectbox("Deck", decks, key="deck")
+    
+    def add_deck():
+        namespace = create_deck(user, st.session_state.new_deck)
+        st.session_state.deck = namespace.rpartition("/")[2] if namespace else DEFAULT_DECK
+        st.session_state.new_deck = ""
+    
+    with st.popover("➕ New deck", use_container_width=True):
+        st.text_input("Deck name", placeholder="e.g., Verbs", key="new_deck")
+        st.button("Create", on_click=add_deck, use_container_width=True)
+    
+    # Switching decks drops the previous deck's study session and Manage page
+    namespace = deck_namespace(user, st.session_state.deck)
+    if st.session_state.get("namespace", namespace) != namespace:
+        st.session_state.flashcards_list = []
+        st.session_state.current_card_index = 0
+        st.session_state.show_answer = False
+        st.session_state.manage_page = 0
+        for key in ("manage_page_data", "duplicate_groups", "last_import_result"):
+            st.session_state.pop(key, None)
+    st.session_state.namespace = namespace
+    st.divider()
+    
     if st.button("🏠 Home", use_container_width=True):
         st.session_state.view = "Home"
     if st.button("📸 Extract from Image", use_container_width=True):
@@ -84,13 +138,17 @@ with st.sidebar:
     st.divider()
     if st.button("📚 Study Mode", use_container_width=True):
         st.session_state.view = "Study"
-        st.session_state.flashcards_list = get_all_flashcards()
+        st.session_state.flashcards_list = get_due_flashcards(namespace=namespace)
         st.session_state.current_card_index = 0
         st.session_state.show_answer = False
-        random.shuffle(st.session_state.flashcards_list)
     if st.button("⚙️ Manage Collection", use_container_width=True):
+        # The cached page is kept: it is only re-read if the deck version changed
         st.session_state.view = "Manage"
-        st.session_state.flashcards_list = get_all_flashcards()
+        st.session_state.manage_page = 0
+    if ADMIN_PANEL:
+        st.divider()
+        if st.button("📈 Metrics", use_container_width=True):
+            st.session_state.view = "Metrics"
 
 # --- UI Help Function ---
 def help_popover(title, description):
@@ -98,6 +156,33 @@ def help_popover(title, description):
         st.markdown(f"### {title}")
         st.info(description)
 
+# --- Background Jobs ---
+@st.fragment(run_every=1.0)
+def poll_job(job_key, result_key, message):
+    """
+    Show the progress of a background job and store its result when it finishes.
+    """
+    job = get_job(st.session_state[job_key])
+    if job is None or job["status"] in ("done", "failed"):
+        del st.session_state[job_key]
+        if job is None:
+            st.session_state[f"{job_key}_error"] = "The job was lost. Please try again."
+        elif job["status"] == "failed":
+            st.session_state[f"{job_key}_error"] = job["error"]
+        else:
+            st.session_state[result_key] = job["result"]
+        st.rerun()
+    
+    if job.get("total"):
+        st.progress(min(1.0, job["done"] / job["total"]), text=f"{message} ({job['done']} of {job['total']})")
+    elif job["status"] == "running":
+        st.info(f"⏳ {message}")
+    else:
+        st.info("⏳ Waiting for a free worker...")
+    partial = job.get("partial") or []
+    if partial:
+        st.markdown("\n".join(f"- 🇫🇷 **{c['palabra']}** - 🇪🇸 {c['traduccion']}" for c in partial))
+
 # --- Main Content ---
 
 if st.session_state.view == "Home":
@@ -129,6 +214,10 @@ if st.session_state.view == "Home":
     
     st.divider()
     
+    due_now = count_due_flashcards(namespace)
+    if due_now:
+        st.info(f"📚 You have **{due_now}** cards due for review.")
+    
     st.markdown("### 🚀 Get Started")
     st.write("1. **Upload or Type:** Go to the sidebar to choose your method.")
     st.write("2. **Save to Deck:** Preview the generated content and add it to your personal collection.")
@@ -139,6 +228,7 @@ if st.session_state.view == "Home":
         st.rerun()
 
 elif st.session_state.view == "Extract":
+    warm_ai_client()
     col1, col2 = st.columns([0.9, 0.1])
     with col1:
         st.title("📸 Image Extraction")
@@ -152,26 +242,51 @@ elif st.session_state.view == "Extract":
     
     st.header("Upload an image with highlighted French words")
     
-    uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
+    uploaded_files = st.file_uploader(
+        "Choose one or more images...", type=["jpg", "jpeg", "png"], accept_multiple_files=True
+    )
     
-    if uploaded_file is not None:
-        st.image(uploaded_file, caption="Selected Image", use_container_width=True)
+    if uploaded_files:
+        if len(uploaded_files) == 1:
+            st.image(uploaded_files[0], caption="Selected Image", use_container_width=True)
+        else:
+            st.write(f"**{len(uploaded_files)} images selected**")
+            thumbs = st.columns(4)
+            for i, uploaded_file in enumerate(uploaded_files):
+                with thumbs[i % 4]:
+                    st.image(uploaded_file, caption=uploaded_file.name, use_container_width=True)
+            max_concurrency = st.slider(
+                "Images processed in parallel", min_value=1, max_value=16, value=MAX_CONCURRENCY,
+                help="Higher is faster, as long as your OpenAI rate limits allow it."
+            )
+        crop_highlights = st.toggle(
+            "Send only highlighted regions",
+            help="Faster and cheaper on pages with few highlighted words. Falls back to the full page if no highlights are detected."
+        )
         
-        if st.button("✨ Process with AI", type="primary", use_container_width=True):
-            with st.spinner("Our AI is analyzing your image..."):
-                with open("temp_image.jpg", "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                result = image_to_text("temp_image.jpg")
-                
-                if "error" in result:
-                    st.error(f"Error: {result['error']}")
-                else:
-                    st.session_state.last_result = result
-                    st.success(f"Great! We found {len(result['flashcards'])} new words.")
+        if st.button("✨ Process with AI", type="primary", use_container_width=True, disabled="extract_job" in st.session_state):
+            images = [f.getvalue() for f in uploaded_files]
+            if len(images) == 1:
+                st.session_state.extract_job = submit_extraction_job(images[0], crop_highlights=crop_highlights)
+            else:
+                st.session_state.extract_job = submit_batch_extraction_job(
+                    images, max_concurrency=max_concurrency, crop_highlights=crop_highlights
+                )
+            st.session_state.pop("last_result", None)
+        
+        if "extract_job" in st.session_state:
+            poll_job("extract_job", "last_result", "Our AI is analyzing your images...")
+        if "extract_job_error" in st.session_state:
+            st.error(f"Error: {st.session_state.pop('extract_job_error')}")
             
         if "last_result" in st.session_state:
             result = st.session_state.last_result
+            st.success(
+                f"Great! We found {len(result['flashcards'])} new words"
+                + (f" ({len(result['duplicates'])} repeated across pages)." if result.get("duplicates") else ".")
+            )
+            for index, error in result.get("errors", {}).items():
+                st.error(f"Image {int(index) + 1}: {error}")
             st.markdown("### Preview:")
             for flashcard in result["flashcards"]:
                 with st.expander(f"🇫🇷 {flashcard['palabra']} - 🇪🇸 {flashcard['traduccion']}"):
@@ -179,15 +294,23 @@ elif st.session_state.view == "Extract":
             
             if st.button("📥 Save to my deck", use_container_width=True):
                 with st.spinner("Saving..."):
-                    db_result = save_flashcards_to_db(result)
+                    db_result = save_flashcards_to_db(result, namespace=namespace)
                     st.success(f"✅ {db_result['added']} flashcards added!")
                     if db_result['duplicates']:
                         st.warning(f"Omitted {len(db_result['duplicates'])} duplicates.")
+                    if db_result['near_duplicates']:
+                        st.warning(
+                            "Omitted near-duplicates: "
+                            + ", ".join(f"{n['palabra']} (≈ {n['similar_to']})" for n in db_result['near_duplicates'])
+                        )
                     del st.session_state.last_result
                     time.sleep(1)
                     st.rerun()
 
 elif st.session_state.view == "AI Gen":
+    warm_ai_client()
+    # The word index is built in the background; there are no suggestions until it is ready
+    deck_index_ready = load_word_index(namespace, wait=False).ready
     col1, col2 = st.columns([0.9, 0.1])
     with col1:
         st.title("✨ AI Generation")
@@ -196,49 +319,147 @@ elif st.session_state.view == "AI Gen":
             "Intelligent Generation",
             "1. Type any French word or phrase you want to learn.\n"
             "2. The AI looks for the most natural translation.\n"
-            "3. It creates a contextualized example to help you memorize."
+            "3. It creates a contextualized example to help you memorize.\n\n"
+            "Words already in your deck (ignoring accents, articles and plurals) are suggested as you type, "
+            "so you don't spend an AI call on them."
         )
     
-    st.markdown("#### What word would you like to learn today?")
-    word = st.text_input("Enter a French word or phrase", placeholder="e.g., Épanouissement")
+    single_tab, bulk_tab = st.tabs(["Single word", "Word list"])
+    
+    with single_tab:
+        st.markdown("#### What word would you like to learn today?")
+        word = st.text_input("Enter a French word or phrase", placeholder="e.g., Épanouissement", key="ai_word", live=True)
+        
+        # Look the word up in the deck while typing (no model call)
+        known = find_in_deck(word, namespace) if word.strip() else None
+        suggestions = [card for card in suggest_words(word, namespace=namespace) if known is None or card["id"] != known["id"]] if word.strip() else []
+        if word.strip() and not deck_index_ready:
+            st.caption("⏳ Indexing your deck for suggestions...")
+        if known:
+            shown_as = "" if known["match"] == "exact" else f" as **{known['palabra']}**"
+            st.info(f"📚 Already in your deck{shown_as}: 🇪🇸 {known['traduccion']}")
+        if suggestions:
+            translations = {card["palabra"]: card["traduccion"] for card in suggestions}
+            
+            def use_suggestion():
+                st.session_state.ai_word = st.session_state.ai_suggestion
+            
+            st.pills(
+                "In your deck", list(translations), key="ai_suggestion", on_change=use_suggestion,
+                format_func=lambda palabra: f"{palabra} · {translations[palabra]}"
+            )
     
-    if st.button("🚀 Create Flashcard", type="primary", use_container_width=True):
-        if word:
-            with st.spinner(f"Generating content for '{word}'..."):
-                result = ai_generate_flashcard(word)
-                if "error" in result:
-                    st.error("Could not generate flashcard. Please try again.")
+        if st.button(
+            "🔁 Generate anyway" if known else "🚀 Create Flashcard", type="secondary" if known else "primary",
+            use_container_width=True, disabled="ai_job" in st.session_state
+        ):
+            if word:
+                st.session_state.ai_job = submit_generation_job(word)
+                st.session_state.pop("last_ai_result", None)
+            else:
+                st.warning("Please enter a word first.")
+        
+        if "ai_job" in st.session_state:
+            poll_job("ai_job", "last_ai_result", f"Generating content for '{word}'...")
+        if "ai_job_error" in st.session_state:
+            st.session_state.pop("ai_job_error")
+            st.error("Could not generate flashcard. Please try again.")
+
+        if "last_ai_result" in st.session_state:
+            card = st.session_state.last_ai_result["flashcards"][0]
+            st.markdown("---")
+            st.markdown(f"""
+                <div class="flashcard-preview">
+                    <h2 style="color: #1f77b4; margin-bottom: 0;">{card['palabra']}</h2>
+                    <h4 style="color: #2e7d32; margin-top: 5px;">🇪🇸 {card['traduccion']}</h4>
+                    <p style="font-style: italic; color: #555;"><b>Example:</b> {card['ejemplo_fr']}</p>
+                </div>
+            """, unsafe_allow_html=True)
+        
+            if st.button("📥 Add to my deck", use_container_width=True):
+                db_result = save_flashcards_to_db(st.session_state.last_ai_result, namespace=namespace)
+                if db_result['added']:
+                    st.success("✅ Added successfully!")
+                elif db_result['near_duplicates']:
+                    st.warning(f"Not added: very similar to '{db_result['near_duplicates'][0]['similar_to']}' in your deck.")
                 else:
-                    st.session_state.last_ai_result = result
-        else:
-            st.warning("Please enter a word first.")
+                    st.warning("This word is already in your deck.")
+                del st.session_state.last_ai_result
+                time.sleep(1)
+                st.rerun()
 
-    if "last_ai_result" in st.session_state:
-        card = st.session_state.last_ai_result["flashcards"][0]
-        st.markdown("---")
-        st.markdown(f"""
-            <div class="flashcard-preview">
-                <h2 style="color: #1f77b4; margin-bottom: 0;">{card['palabra']}</h2>
-                <h4 style="color: #2e7d32; margin-top: 5px;">🇪🇸 {card['traduccion']}</h4>
-                <p style="font-style: italic; color: #555;"><b>Example:</b> {card['ejemplo_fr']}</p>
-            </div>
-        """, unsafe_allow_html=True)
+    with bulk_tab:
+        st.markdown("#### Paste a vocabulary list or upload a text file")
+        word_list_text = st.text_area(
+            "One word per line (commas and semicolons also work)",
+            placeholder="épanouissement\nfeuilleter\nau fur et à mesure",
+            height=180
+        )
+        word_file = st.file_uploader("...or upload a .txt / .csv file", type=["txt", "csv"])
+        words = parse_word_list(word_list_text + "\n" + (word_file.getvalue().decode("utf-8", errors="ignore") if word_file else ""))
+        if words:
+            st.caption(f"{len(words)} unique words detected.")
+        known_words = [w for w in words if find_in_deck(w, namespace)]
+        if known_words and st.checkbox(
+            f"Skip {len(known_words)} words already in my deck", value=True, help=", ".join(known_words[:30])
+        ):
+            skipped = set(known_words)
+            words = [w for w in words if w not in skipped]
         
-        if st.button("📥 Add to my deck", use_container_width=True):
-            db_result = save_flashcards_to_db(st.session_state.last_ai_result)
-            st.success("✅ Added successfully!")
-            del st.session_state.last_ai_result
-            time.sleep(1)
-            st.rerun()
+        if st.button("🚀 Create all flashcards", type="primary", use_container_width=True, disabled=not words or "bulk_job" in st.session_state):
+            st.session_state.bulk_job = submit_bulk_generation_job(words)
+            st.session_state.pop("last_bulk_result", None)
+        
+        if "bulk_job" in st.session_state:
+            poll_job("bulk_job", "last_bulk_result", "Generating flashcards...")
+        if "bulk_job_error" in st.session_state:
+            st.error(f"Error: {st.session_state.pop('bulk_job_error')}")
+        
+        if "last_bulk_result" in st.session_state:
+            result = st.session_state.last_bulk_result
+            st.success(f"{len(result['flashcards'])} flashcards generated with {result['calls']} AI calls.")
+            if result["missing"]:
+                st.warning(f"Could not generate {len(result['missing'])} words: {', '.join(result['missing'])}")
+            st.dataframe(
+                [{"French": c["palabra"], "Spanish": c["traduccion"], "Example": c["ejemplo_fr"]} for c in result["flashcards"]],
+                use_container_width=True,
+                hide_index=True
+            )
+            if st.button("📥 Add all to my deck", use_container_width=True):
+                with st.spinner("Saving..."):
+                    db_result = save_flashcards_to_db({"flashcards": result["flashcards"]}, namespace=namespace)
+                    st.success(f"✅ {db_result['added']} flashcards added!")
+                    if db_result['duplicates']:
+                        st.warning(f"Omitted {len(db_result['duplicates'])} duplicates.")
+                    if db_result['near_duplicates']:
+                        st.warning(
+                            "Omitted near-duplicates: "
+                            + ", ".join(f"{n['palabra']} (≈ {n['similar_to']})" for n in db_result['near_duplicates'])
+                        )
+                    del st.session_state.last_bulk_result
+                    time.sleep(1)
+                    st.rerun()
 
 elif st.session_state.view == "Study":
     st.title("📚 Study Mode")
     
-    if not st.session_state.flashcards_list:
-        st.info("Your deck is empty. Use the Camera or AI to create some flashcards!")
+    total = len(st.session_state.flashcards_list)
+    
+    if st.session_state.current_card_index >= total:
+        due_now = count_due_flashcards(namespace)
+        if total:
+            st.success(f"🎉 Session complete! {total} reviews done.")
+        elif due_now == 0:
+            st.info("Nothing to review right now. Come back later, or create new flashcards with the Camera or AI!")
+        if due_now:
+            st.write(f"**{due_now}** cards are due for review.")
+            if st.button("📚 Start a session" if not total else "🔁 Review more", type="primary", use_container_width=True):
+                st.session_state.flashcards_list = get_due_flashcards(namespace=namespace)
+                st.session_state.current_card_index = 0
+                st.session_state.show_answer = False
+                st.rerun()
     else:
         current = st.session_state.current_card_index + 1
-        total = len(st.session_state.flashcards_list)
         st.progress(current / total)
         st.write(f"Card {current} of {total}")
         
@@ -273,23 +494,18 @@ elif st.session_state.view == "Study":
                 </div>
             """, unsafe_allow_html=True)
             
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("⬅️ Previous", use_container_width=True, disabled=(st.session_state.current_card_index == 0)):
-                    st.session_state.current_card_index -= 1
-                    st.session_state.show_answer = False
-                    st.rerun()
-            with col2:
-                if st.session_state.current_card_index < total - 1:
-                    if st.button("Next ➡️", use_container_width=True):
+            st.write("How well did you remember it?")
+            grade_cols = st.columns(4)
+            for col, (grade, label) in zip(grade_cols, [("again", "🔁 Again"), ("hard", "😓 Hard"), ("good", "🙂 Good"), ("easy", "😎 Easy")]):
+                with col:
+                    if st.button(label, key=f"grade_{grade}", use_container_width=True):
+                        review_flashcard(card["id"], grade, namespace)
+                        # Cards answered wrong go back to the end of the session
+                        if grade == "again":
+                            st.session_state.flashcards_list.append(card)
                         st.session_state.current_card_index += 1
                         st.session_state.show_answer = False
                         st.rerun()
-                else:
-                    if st.button("🎉 Finish Session", use_container_width=True):
-                        st.balloons()
-                        st.session_state.view = "Home"
-                        st.rerun()
 
 elif st.session_state.view == "Manage":
     col1, col2 = st.columns([0.9, 0.1])
@@ -299,26 +515,276 @@ elif st.session_state.view == "Manage":
         help_popover(
             "Deck Management",
             "Here you can review all your saved words.\n\n"
-            "- Use the 🗑️ button to remove words you've mastered or were incorrect.\n"
+            "- Tick the cards you've mastered (or *Select all matching*) and delete them in one go.\n"
+            "- Edit translations and examples in the table, then save them all at once.\n"
             "- Deletion is permanent."
         )
     
-    if not st.session_state.flashcards_list:
-        st.info("Your collection is currently empty.")
+    with st.expander("🔍 Find duplicates"):
+        st.caption("Finds cards that mean the same thing (e.g. *le chat*, *chat* and *Chats*) using their stored embeddings.")
+        threshold = st.slider("Similarity threshold", min_value=0.75, max_value=0.99, value=NEAR_DUPLICATE_THRESHOLD, step=0.01)
+        if st.button("Scan collection", use_container_width=True):
+            with st.spinner("Scanning your collection..."):
+                st.session_state.duplicate_groups = find_duplicate_flashcards(threshold=threshold, namespace=namespace)
+        if "duplicate_groups" in st.session_state:
+            if not st.session_state.duplicate_groups:
+                st.success("No duplicates found.")
+            for g, group in enumerate(st.session_state.duplicate_groups):
+                st.markdown(f"**Group {g + 1}**")
+                for card in group:
+                    c1, c2 = st.columns([0.85, 0.15])
+                    with c1:
+                        st.write(f"{card['palabra']} — 🇪🇸 {card['traduccion']}")
+                    with c2:
+                        if st.button("🗑️", key=f"dup_del_{card['id']}", help="Delete permanently"):
+                            delete_flashcard(card['palabra'], namespace)
+                            group.remove(card)
+                            st.session_state.duplicate_groups = [grp for grp in st.session_state.duplicate_groups if len(grp) > 1]
+                            st.toast(f"Deleted: {card['palabra']}")
+                            st.rerun()
+    
+    with st.expander("📦 Import / Export"):
+        st.caption("Import a deck from CSV (palabra, traduccion, ejemplo_fr), JSONL or an Anki text export, or download your whole collection.")
+        deck_file = st.file_uploader("Deck file", type=["csv", "jsonl", "ndjson", "txt", "tsv"])
+        update_existing = st.checkbox("Update cards that are already in my deck", help="Otherwise existing words are skipped.")
+        if st.button("📥 Import deck", use_container_width=True, disabled=deck_file is None or "import_job" in st.session_state):
+            st.session_state.import_job = submit_import_job(
+                deck_file.getvalue(), detect_format(deck_file.name), update_existing=update_existing, namespace=namespace
+            )
+            st.session_state.pop("last_import_result", None)
+        if "import_job" in st.session_state:
+            poll_job("import_job", "last_import_result", "Importing deck...")
+        if "import_job_error" in st.session_state:
+            st.error(f"Error: {st.session_state.pop('import_job_error')}")
+        if "last_import_result" in st.session_state:
+            summary = st.session_state.last_import_result
+            st.success(
+                f"✅ {summary['added']} cards added, {summary['updated']} updated, "
+                f"{summary['duplicates']} already in your deck ({summary['seconds']} s)."
+            )
+            if summary["near_duplicates"]:
+                st.warning(f"Skipped {summary['near_duplicates']} cards very similar to existing ones.")
+            if summary["invalid"]:
+                st.warning(
+                    f"Skipped {summary['invalid']} invalid rows: "
+                    + "; ".join(f"line {e['line']}: {e['error']}" for e in summary["errors"][:5])
+                )
+        
+        st.divider()
+        export_col, download_col = st.columns(2)
+        with export_col:
+            export_format = st.selectbox("Export format", FORMATS, format_func={"csv": "CSV", "jsonl": "JSONL", "anki": "Anki (text)"}.get)
+        with download_col:
+            # The export runs only when the button is clicked and its bytes are not kept in the session
+            st.download_button(
+                "⬇️ Download", lambda fmt=export_format: export_deck_bytes(fmt, namespace),
+                file_name=f"{st.session_state.deck}.{'txt' if export_format == 'anki' else export_format}",
+                mime="text/plain", on_click="ignore", use_container_width=True
+            )
+    
+    search_col, mode_col, size_col = st.columns([0.5, 0.3, 0.2])
+    with search_col:
+        search = st.text_input("Search", placeholder="Word or translation", label_visibility="collapsed")
+    with mode_col:
+        search_mode = st.radio("Match", ["Starts with", "Contains"], horizontal=True, label_visibility="collapsed")
+    with size_col:
+        page_size = st.selectbox("Page size", [25, 50, 100], label_visibility="collapsed")
+    
+    # When the filter changes, go back to the first page
+    if st.session_state.get("manage_filter") != (search, search_mode, page_size):
+        st.session_state.manage_filter = (search, search_mode, page_size)
+        st.session_state.manage_page = 0
+    
+    # The page is kept in the session and only re-read when the filter or page changes, or when the
+    # deck version changed (another session or process wrote to it). Deletes and edits made here
+    # patch it in place
+    page_key = (namespace, search, search_mode, page_size, st.session_state.manage_page)
+    if st.session_state.get("manage_page_key") != (page_key, deck_version(namespace)) or "manage_page_data" not in st.session_state:
+        st.session_state.manage_page_data = get_flashcards_page(
+            limit=page_size,
+            offset=st.session_state.manage_page * page_size,
+            prefix=search if search_mode == "Starts with" else None,
+            contains=search if search_mode == "Contains" else None,
+            namespace=namespace,
+        )
+        st.session_state.manage_page_key = (page_key, deck_version(namespace))
+    page = st.session_state.manage_page_data
+    if not page["flashcards"] and st.session_state.manage_page > 0:
+        # The last page came back empty (e.g. after a delete): go to the last page that exists
+        st.session_state.manage_page = max(0, (page["total"] - 1) // page_size)
+        st.rerun()
+    st.session_state.flashcards_list = page["flashcards"]
+    
+    if not page["total"]:
+        st.info("No words match your search." if search else "Your collection is currently empty.")
     else:
-        st.write(f"You have learned **{len(st.session_state.flashcards_list)}** words so far.")
+        if search:
+            st.write(f"**{page['total']}** words match your search.")
+        else:
+            st.write(f"You have learned **{page['total']}** words so far.")
+        
+        # Changing the editor key drops the selections and edits that were already applied
+        editor_key = f"manage_editor_{st.session_state.get('manage_editor_version', 0)}"
+        edited = st.data_editor(
+            [
+                {"select": False, "palabra": card["palabra"], "traduccion": card["traduccion"], "ejemplo_fr": card["ejemplo_fr"]}
+                for card in page["flashcards"]
+            ],
+            key=editor_key,
+            hide_index=True,
+            use_container_width=True,
+            disabled=["palabra"],
+            column_config={
+                "select": st.column_config.CheckboxColumn("🗑️", width="small"),
+                "palabra": "Word",
+                "traduccion": "Translation",
+                "ejemplo_fr": "Example",
+            },
+        )
+        select_all = st.checkbox(
+            f"Select all {page['total']} matching cards" if search else f"Select all {page['total']} cards",
+            key=f"manage_select_all_{st.session_state.get('manage_editor_version', 0)}",
+        )
+        selected = [card for card, row in zip(page["flashcards"], edited) if row["select"]]
+        changed = [
+            {"palabra": card["palabra"], "traduccion": row["traduccion"].strip(), "ejemplo_fr": (row["ejemplo_fr"] or "").strip()}
+            for card, row in zip(page["flashcards"], edited)
+            if (row["traduccion"] or "").strip() and (
+                row["traduccion"].strip() != card["traduccion"] or (row["ejemplo_fr"] or "").strip() != card["ejemplo_fr"]
+            )
+        ]
+        
+        delete_col, save_col = st.columns(2)
+        with delete_col:
+            delete_count = page["total"] if select_all else len(selected)
+            if st.button(f"🗑️ Delete {delete_count} selected", use_container_width=True, disabled=not delete_count):
+                with st.spinner("Deleting..."):
+                    if select_all:
+                        ids = get_flashcard_ids(
+                            prefix=search if search_mode == "Starts with" else None,
+                            contains=search if search_mode == "Contains" else None,
+                            namespace=namespace,
+                        )
+                    else:
+                        ids = [card["id"] for card in selected]
+                    deleted = delete_flashcards(ids, namespace)
+                removed = set(ids)
+                page["flashcards"] = [card for card in page["flashcards"] if card["id"] not in removed]
+                page["total"] = max(0, page["total"] - deleted)
+                if not page["flashcards"] and page["total"]:
+                    # The whole page was deleted but more cards remain: read the next one
+                    st.session_state.pop("manage_page_data")
+                st.session_state.manage_page_key = (page_key, deck_version(namespace))
+                st.session_state.manage_editor_version = st.session_state.get("manage_editor_version", 0) + 1
+                st.toast(f"Deleted {deleted} cards")
+                st.rerun()
+        with save_col:
+            if st.button(f"💾 Save {len(changed)} edits", use_container_width=True, disabled=not changed):
+                with st.spinner("Saving..."):
+                    update_flashcards(changed, namespace)
+                edits = {card["palabra"]: card for card in changed}
+                for card in page["flashcards"]:
+                    if card["palabra"] in edits:
+                        card.update(traduccion=edits[card["palabra"]]["traduccion"], ejemplo_fr=edits[card["palabra"]]["ejemplo_fr"])
+                st.session_state.manage_page_key = (page_key, deck_version(namespace))
+                st.session_state.manage_editor_version = st.session_state.get("manage_editor_version", 0) + 1
+                st.toast(f"Saved {len(changed)} cards")
+                st.rerun()
         st.divider()
         
-        for i, card in enumerate(st.session_state.flashcards_list):
-            c1, c2 = st.columns([0.85, 0.15])
-            with c1:
-                st.markdown(f"**{card['palabra']}**")
-                st.caption(f"🇪🇸 {card['traduccion']}")
-            with c2:
-                if st.button("🗑️", key=f"del_{i}", help="Delete permanently"):
-                    delete_flashcard(card['palabra'])
-                    st.toast(f"Deleted: {card['palabra']}")
-                    time.sleep(0.5)
-                    st.session_state.flashcards_list = get_all_flashcards()
-                    st.rerun()
-            st.divider()
+        last_page = (page["total"] - 1) // page_size
+        prev_col, info_col, next_col = st.columns([0.3, 0.4, 0.3])
+        with prev_col:
+            if st.button("⬅️ Previous", use_container_width=True, disabled=st.session_state.manage_page == 0):
+                st.session_state.manage_page -= 1
+                st.rerun()
+        with info_col:
+            st.markdown(
+                f"<p style='text-align: center;'>Page {st.session_state.manage_page + 1} of {last_page + 1}</p>",
+                unsafe_allow_html=True
+            )
+        with next_col:
+            if st.button("Next ➡️", use_container_width=True, disabled=st.session_state.manage_page >= last_page):
+                st.session_state.manage_page += 1
+                st.rerun()
+
+elif st.session_state.view == "Metrics" and ADMIN_PANEL:
+    col1, col2 = st.columns([0.9, 0.1])
+    with col1:
+        st.title("📈 Performance Metrics")
+    with col2:
+        help_popover(
+            "Performance Metrics",
+            "Timings for each processing stage, collected by this server since it started (or since the last reset).\n\n"
+            "- p50 is the typical duration, p95 the slow tail.\n"
+            "- Costs are estimates from token counts and list prices."
+        )
+    
+    summary = get_metrics_summary()
+    models = summary["models"].values()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Estimated cost", f"${summary['total_cost_usd']:.4f}")
+    m2.metric("AI calls", sum(model["calls"] for model in models))
+    m3.metric("Tokens", f"{sum(model['prompt'] + model['completion'] for model in models):,}")
+    
+    st.markdown("#### Stages")
+    if summary["stages"]:
+        st.dataframe(
+            [
+                {"Stage": stage, "Calls": s["count"], "p50 (ms)": s["p50_ms"], "p95 (ms)": s["p95_ms"],
+                 "Mean (ms)": s["mean_ms"], "Total (s)": s["total_s"]}
+                for stage, s in summary["stages"].items()
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.info("No measurements yet. Extract, generate or save some cards first.")
+    
+    if summary["models"]:
+        st.markdown("#### Models")
+        st.dataframe(
+            [
+                {"Model": name, "Calls": m["calls"], "Prompt tokens": m["prompt"],
+                 "Completion tokens": m["completion"], "Cost (USD)": m["cost_usd"]}
+                for name, m in summary["models"].items()
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    st.markdown("#### Caches")
+    st.dataframe(
+        [
+            {"Cache": name, "Hit rate": f"{stats['hit_rate']:.0%}", "Hits": stats["hits"], "Misses": stats["misses"],
+             "Entries": stats["entries"], "Size (MB)": round(stats["bytes"] / 1024 / 1024, 1)}
+            for name, stats in (("AI responses", cache_stats()), ("Embeddings", embeddings_cache_stats()))
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    st.markdown("#### API calls")
+    st.dataframe(
+        [
+            {"API": name, "Calls": stats["calls"], "Retries": stats["retries"], "Rate limited (429)": stats["rate_limited"],
+             "Coalesced": stats["coalesced"], "Failed": stats["failed"], "Queued": stats["queued"]}
+            for name, stats in (("Chat", scheduler_stats()["llm"]), ("Embeddings", scheduler_stats()["embeddings"]))
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+    
+    if summary["bytes"]:
+        st.caption(" · ".join(f"{stage}: {size / 1024:,.0f} KB" for stage, size in summary["bytes"].items()))
+    
+    dl_col, reset_col = st.columns(2)
+    with dl_col:
+        st.download_button(
+            "⬇️ Prometheus metrics", metrics_text(), file_name="flashcards_metrics.prom",
+            mime="text/plain", use_container_width=True
+        )
+    with reset_col:
+        if st.button("🔄 Reset", use_container_width=True):
+            reset_metrics()
+            st.rerun()
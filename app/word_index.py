@@ -0,0 +1,224 @@
+import bisect
+import threading
+import unicodedata
+from typing import Iterable, List, Optional
+
+# Artículos y pronombres (franceses y españoles) que no cuentan al comparar palabras
+# ("le chat" / "chat", "s'épanouir" / "épanouir", "el gato" / "gato")
+ARTICLES = ("de la ", "de l'", "les ", "le ", "la ", "l'", "une ", "un ", "des ", "du ", "se ", "s'",
+            "el ", "los ", "las ", "unos ", "unas ")
+
+
+class _FoldTable(dict):
+    # Tabla para str.translate que calcula (y recuerda) la forma sin acentos de cada carácter
+    def __missing__(self, code: int) -> str:
+        decomposed = unicodedata.normalize("NFKD", chr(code))
+        self[code] = "".join(char for char in decomposed if not unicodedata.combining(char))
+        return self[code]
+
+
+_FOLD_TABLE = _FoldTable({ord("œ"): "oe", ord("æ"): "ae", ord("’"): "'", ord("ʼ"): "'"})
+
+
+def fold(text: str) -> str:
+    """
+    Forma de búsqueda de un texto: minúsculas, sin acentos ni ligaduras y con los espacios colapsados.
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = text.translate(_FOLD_TABLE)
+    return " ".join(text.split())
+
+
+def _strip_article(key: str) -> str:
+    if key.startswith(ARTICLES):
+        for article in ARTICLES:
+            if key.startswith(article) and len(key) > len(article):
+                return key[len(article):]
+    return key
+
+
+def variant_key(text: str, folded: bool = False) -> str:
+    """
+    Clave que comparten las variantes de una palabra: sin artículo inicial y sin la -s/-x del plural
+    ("Les Chats" y "chat" dan la misma clave). Con `folded` el texto ya viene pasado por fold().
+    """
+    key = _strip_article(text if folded else fold(text))
+    return " ".join(word[:-1] if len(word) > 3 and word[-1] in "sx" else word for word in key.split())
+
+
+def _add_id(index: dict, key: str, u_id: str):
+    # Una tupla por clave ocupa bastante menos que un set (casi todas tienen un solo id)
+    index[key] = index.get(key, ()) + (u_id,)
+
+
+def _remove_id(index: dict, key: str, u_id: str):
+    ids = tuple(other for other in index.get(key, ()) if other != u_id)
+    if ids:
+        index[key] = ids
+    else:
+        index.pop(key, None)
+
+
+class WordIndex:
+    """
+    Índice en memoria de las palabras del mazo para autocompletar y saber si una palabra ya está.
+
+    Guarda solo id, palabra y traducción. Las búsquedas por prefijo usan listas ordenadas de
+    claves (bisect) y las exactas, diccionarios; ambas ignoran mayúsculas y acentos. Las
+    altas se ordenan en la siguiente consulta y las bajas se descartan al leer, así que
+    mantenerlo al día no recorre el índice.
+
+    `version` es la versión del mazo (ver CardStore.version) que refleja el índice; apply()
+    le aplica los cambios posteriores sin reconstruirlo. Es la única forma de actualizarlo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Vacía el índice; hay que volver a construirlo (por ejemplo, al cambiar de colección).
+        """
+        with self._lock:
+            self._entries = {}
+            self._exact = {}
+            self._variants = {}
+            # Listas ordenadas de (clave, id, generación); una entrada antigua se reconoce por su generación
+            self._words = []
+            self._translations = []
+            self._generation = 0
+            self._dirty = False
+            self._stale = 0
+            self.version = 0
+            self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def build(self, cards: Iterable[dict], version: int = 0):
+        """
+        Carga el índice desde las flashcards existentes y lo marca como listo.
+
+        `version` es la del mazo antes de empezar a leerlo: lo que se agregue o borre mientras
+        tanto tiene una versión posterior y llega con el siguiente apply().
+        """
+        batch = []
+        for card in cards:
+            batch.append(card)
+            if len(batch) >= 5000:
+                self._load(batch)
+                batch = []
+        self._load(batch)
+        with self._lock:
+            self.version = version
+            self.ready = True
+
+    def apply(self, changes: dict):
+        """
+        Aplica los cambios del mazo ({"version", "upserted", "deleted"}, ver CardStore.changes).
+        """
+        with self._lock:
+            # Dos lectores pueden traer los mismos cambios: solo cuenta el más reciente
+            if not self.ready or changes["version"] <= self.version:
+                return
+            for u_id in changes["deleted"]:
+                if u_id in self._entries:
+                    self._discard(u_id)
+            self._add(changes["upserted"])
+            self.version = changes["version"]
+
+    def _load(self, cards: list):
+        with self._lock:
+            self._add(card for card in cards if card["id"] not in self._entries)
+
+    def _add(self, cards: Iterable[dict]):
+        # Se llama con el lock tomado
+        for card in cards:
+            u_id = card["id"]
+            if u_id in self._entries:
+                self._discard(u_id)
+            self._generation += 1
+            entry = (card["palabra"], card["traduccion"], self._generation)
+            self._entries[u_id] = entry
+            word = fold(card["palabra"])
+            variant = variant_key(word, folded=True)
+            _add_id(self._exact, word, u_id)
+            _add_id(self._variants, variant, u_id)
+            # Sin artículo también, para que "chat" sugiera "le chat" y "gato" encuentre "el gato"
+            self._words.append((word, u_id, entry[2]))
+            stripped = _strip_article(word)
+            if stripped != word:
+                self._words.append((stripped, u_id, entry[2]))
+            translation = fold(card["traduccion"])
+            self._translations.append((translation, u_id, entry[2]))
+            stripped = _strip_article(translation)
+            if stripped != translation:
+                self._translations.append((stripped, u_id, entry[2]))
+            self._dirty = True
+
+    def _discard(self, u_id: str):
+        palabra, _, _ = self._entries.pop(u_id)
+        word = fold(palabra)
+        _remove_id(self._exact, word, u_id)
+        _remove_id(self._variants, variant_key(word, folded=True), u_id)
+        self._stale += 1
+
+    def _refresh(self):
+        # Se llama con el lock tomado: ordena las altas y compacta si hay muchas entradas antiguas
+        if self._stale > len(self._entries):
+            self._words = [item for item in self._words if self._current(item)]
+            self._translations = [item for item in self._translations if self._current(item)]
+            self._stale = 0
+        if self._dirty:
+            self._words.sort()
+            self._translations.sort()
+            self._dirty = False
+
+    def _current(self, item: tuple) -> bool:
+        entry = self._entries.get(item[1])
+        return entry is not None and entry[2] == item[2]
+
+    def _card(self, u_id: str, match: str) -> dict:
+        palabra, traduccion, _ = self._entries[u_id]
+        return {"id": u_id, "palabra": palabra, "traduccion": traduccion, "match": match}
+
+    def lookup(self, word: str) -> Optional[dict]:
+        """
+        Busca una palabra en el mazo: primero igual (sin acentos ni mayúsculas) y si no, una variante
+        (artículo o plural).
+
+        Returns:
+            Dict {"id", "palabra", "traduccion", "match": "exact" | "variant"} o None
+        """
+        word = fold(word)
+        with self._lock:
+            for index, key, match in ((self._exact, word, "exact"), (self._variants, variant_key(word, folded=True), "variant")):
+                ids = index.get(key)
+                if ids:
+                    return self._card(min(ids), match)
+        return None
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[dict]:
+        """
+        Flashcards cuya palabra (o, después, su traducción) empieza por `prefix`.
+
+        Returns:
+            Lista de dicts {"id", "palabra", "traduccion", "match": "word" | "translation"}
+        """
+        key = fold(prefix)
+        if not key:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            self._refresh()
+            for items, match in ((self._words, "word"), (self._translations, "translation")):
+                for position in range(bisect.bisect_left(items, (key,)), len(items)):
+                    item = items[position]
+                    if len(results) >= limit or not item[0].startswith(key):
+                        break
+                    if item[1] not in seen and self._current(item):
+                        seen.add(item[1])
+                        results.append(self._card(item[1], match))
+        return results
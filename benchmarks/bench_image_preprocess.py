@@ -0,0 +1,100 @@
+"""
+Benchmark: tamaño del payload y tokens de imagen con y sin preprocesado local.
+
+Sin argumentos genera una foto sintética de 12 MP (página con texto y tres palabras
+resaltadas). Con --image usa una foto real; con --live además mide el tiempo total de
+image_to_text contra la API (requiere OPENAI_API_KEY, sin caché).
+
+Uso:
+    python benchmarks/bench_image_preprocess.py
+    python benchmarks/bench_image_preprocess.py --image data/page.jpg --live
+"""
+import argparse
+import base64
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from PIL import Image, ImageDraw
+
+from image_processing import estimate_image_tokens, preprocess_image
+
+
+def synthetic_page(width: int = 4032, height: int = 3024, highlights: int = 3) -> bytes:
+    rng = random.Random(0)
+    page = Image.new("RGB", (width, height), (246, 243, 236))
+    draw = ImageDraw.Draw(page)
+    line_height = height // 40
+    highlighted_lines = set(rng.sample(range(2, 38), highlights))
+    for line in range(2, 38):
+        y = line * line_height
+        x = width // 12
+        word = 0
+        while x < width * 11 // 12:
+            word_w = rng.randint(width // 60, width // 15)
+            if line in highlighted_lines and word == 4:
+                draw.rectangle((x - 12, y - line_height // 4, x + word_w + 12, y + line_height * 3 // 4), fill=(250, 245, 60))
+            draw.rectangle((x, y, x + word_w, y + line_height // 2), fill=(30, 30, 30))
+            x += word_w + width // 80
+            word += 1
+    # Ruido de sensor, como en una foto real
+    noise = Image.effect_noise((width, height), 12).convert("RGB")
+    page = Image.blend(page, noise, 0.08)
+    buffer = io.BytesIO()
+    page.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", help="Foto real a usar en lugar de la página sintética")
+    parser.add_argument("--live", action="store_true", help="Mide también image_to_text contra la API")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            raw = f.read()
+    else:
+        raw = synthetic_page()
+    original = Image.open(io.BytesIO(raw))
+
+    print(f"{'modo':<22}{'bytes':>12}{'base64':>12}{'tokens':>8}{'prep ms':>10}")
+    modes = {
+        "original": None,
+        "preprocesada": {},
+        "recortes resaltados": {"crop_highlights": True},
+    }
+    for name, options in modes.items():
+        t0 = time.perf_counter()
+        if options is None:
+            data, size = raw, original.size
+        else:
+            prepared = preprocess_image(raw, **options)
+            data, size = prepared["data"], (prepared["width"], prepared["height"])
+        elapsed = (time.perf_counter() - t0) * 1000
+        b64 = len(base64.b64encode(data))
+        print(f"{name:<22}{len(data):>12,}{b64:>12,}{estimate_image_tokens(*size):>8}{elapsed:>10.1f}")
+
+    if args.live:
+        import functions
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
+            tmp.write(raw)
+        try:
+            print()
+            for name, options in (("original", {"preprocess": False}), ("preprocesada", {}), ("recortes resaltados", {"crop_highlights": True})):
+                t0 = time.perf_counter()
+                result = functions.image_to_text(tmp.name, use_cache=False, **options)
+                cards = len(result.get("flashcards", []))
+                print(f"{name:<22} end-to-end {time.perf_counter() - t0:6.2f} s  ({cards} flashcards)")
+        finally:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: planificador de llamadas al modelo contra un servidor falso que responde 429.
+
+Levanta `fake_openai.py` con un límite de N peticiones por segundo (y, opcionalmente, un
+porcentaje de 503) y mide con el código de la app:
+
+- burst: muchas generaciones de una palabra a la vez, sin límite en el cliente (solo
+  reintentos tras cada 429) frente al planificador con el mismo límite que el servidor
+- lanes: latencia de las generaciones interactivas mientras corre una generación masiva,
+  con carriles de prioridad y sin ellos (todo en el carril masivo)
+- coalesce: peticiones idénticas simultáneas (single-flight) y llamadas que llegan al servidor
+
+Uso:
+    python benchmarks/bench_llm_scheduler.py
+    python benchmarks/bench_llm_scheduler.py --rate-limit 10 --words 60 --error-rate 0.1
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+
+from fake_openai import start_server
+
+
+def scheduler(functions, rpm: float = 0, **kwargs):
+    # Sustituye el planificador del proceso. El servidor falso cuenta en una ventana deslizante de 1 s, así que
+    # el cliente se queda un 10 % por debajo y casi sin ráfaga (cubeta + ritmo no deben pasar del límite)
+    from llm_scheduler import RequestScheduler
+
+    functions.llm_scheduler = RequestScheduler("llm", rpm=rpm * 0.9, burst_seconds=0.1, metrics=functions.metrics, **kwargs)
+    return functions.llm_scheduler
+
+
+def generate(functions, words: list, threads: int) -> tuple:
+    # Devuelve (segundos, latencias, fallos)
+    latencies, failures = [], []
+
+    def run(word):
+        t0 = time.perf_counter()
+        try:
+            functions.ai_generate_flashcard(word, use_cache=False)
+            latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            failures.append(str(e))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(run, words))
+    return time.perf_counter() - t0, latencies, failures
+
+
+def bench_burst(functions, fake, words: int, rate_limit: int):
+    print(f"\nburst: {words} palabras con 32 hilos, servidor limitado a {rate_limit}/s")
+    for label, rpm in (("solo reintentos", 0), ("planificador", rate_limit * 60)):
+        sched = scheduler(functions, rpm=rpm, max_retries=8, base_delay=0.2)
+        before = dict(fake.requests)
+        seconds, latencies, failures = generate(functions, [f"burst-{rpm}-{i}" for i in range(words)], 32)
+        stats = sched.stats()
+        print(f"  {label:16s} {seconds:6.2f} s, p95 {statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else 0:7.0f} ms, "
+              f"{fake.requests['rate_limited'] - before['rate_limited']:4d} respuestas 429, "
+              f"{stats['retries']:4d} reintentos, {len(failures)} fallos")
+
+
+def bench_lanes(functions, rate_limit: int, bulk_words: int, interactive: int):
+    print(f"\nlanes: {interactive} palabras sueltas durante una generación masiva de {bulk_words} palabras")
+    from llm_scheduler import BULK, lane
+
+    for label, priority in (("con carriles", None), ("sin carriles", BULK)):
+        scheduler(functions, rpm=rate_limit * 60)
+        functions.metrics.reset()
+        bulk = threading.Thread(
+            target=functions.ai_generate_flashcards_bulk,
+            args=([f"bulk-{label}-{i}" for i in range(bulk_words)],),
+            kwargs={"chunk_size": 2, "max_concurrency": 16, "use_cache": False},
+        )
+        bulk.start()
+        time.sleep(0.5)
+        latencies = []
+        for i in range(interactive):
+            t0 = time.perf_counter()
+            if priority is None:
+                functions.ai_generate_flashcard(f"solo-{label}-{i}", use_cache=False)
+            else:
+                with lane(priority):
+                    functions.ai_generate_flashcard(f"solo-{label}-{i}", use_cache=False)
+            latencies.append(time.perf_counter() - t0)
+        bulk.join()
+        queue = functions.metrics.summary()["stages"].get("llm.queue.interactive" if priority is None else "llm.queue.bulk", {})
+        print(f"  {label:16s} palabra suelta p50 {statistics.median(latencies) * 1000:6.0f} ms, "
+              f"máx {max(latencies) * 1000:6.0f} ms, cola p50 {queue.get('p50_ms', 0)} ms, "
+              f"{functions.llm_scheduler.stats()['rate_limited']} respuestas 429")
+
+
+def bench_coalesce(functions, fake, callers: int):
+    print(f"\ncoalesce: {callers} peticiones idénticas a la vez")
+    sched = scheduler(functions)
+    before = fake.requests["chat"]
+    seconds, _, failures = generate(functions, ["le chat"] * callers, callers)
+    print(f"  {fake.requests['chat'] - before} llamadas al servidor, {sched.stats()['coalesced']} unidas, "
+          f"{seconds * 1000:.0f} ms, {len(failures)} fallos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate-limit", type=int, default=20, help="Peticiones por segundo que admite el servidor falso")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones que fallan con 503")
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos por respuesta de chat")
+    parser.add_argument("--words", type=int, default=120, help="Palabras de la prueba burst")
+    parser.add_argument("--bulk-words", type=int, default=200, help="Palabras de la generación masiva en lanes")
+    parser.add_argument("--interactive", type=int, default=5, help="Palabras sueltas en lanes")
+    args = parser.parse_args()
+
+    server, fake, base_url = start_server(
+        latency=args.latency, rate_limit=args.rate_limit, rate_window=1.0, error_rate=args.error_rate
+    )
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        OPENAI_BASE_URL=base_url,
+        OPENAI_API_KEY="sk-fake",
+        FLASHCARDS_DB_PATH=os.path.join(tmp, "flashcards.sqlite"),
+        FLASHCARDS_CACHE_PATH=os.path.join(tmp, "llm_responses.sqlite"),
+        FLASHCARDS_EMBEDDINGS_CACHE_PATH=os.path.join(tmp, "embeddings.sqlite"),
+    )
+    import functions
+
+    bench_burst(functions, fake, args.words, args.rate_limit)
+    bench_lanes(functions, args.rate_limit, args.bulk_words, args.interactive)
+    bench_coalesce(functions, fake, 16)
+    print(f"\nServidor: {fake.requests}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
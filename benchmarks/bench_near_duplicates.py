@@ -0,0 +1,75 @@
+"""
+Benchmark: barrido de casi-duplicados (find_duplicate_flashcards) sobre una colección grande.
+
+Crea una colección temporal con N vectores aleatorios normalizados y un porcentaje de
+casi-duplicados plantados, y mide cuánto tarda el barrido completo y cuántos grupos encuentra.
+
+Uso:
+    python benchmarks/bench_near_duplicates.py --cards 50000 --dim 256
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import functions
+
+
+def random_unit_vector(rng: random.Random, dim: int, base: list = None, noise: float = 0.2) -> list:
+    if base is None:
+        vector = [rng.gauss(0, 1) for _ in range(dim)]
+    else:
+        # Ruido de norma ~noise sobre un vector unitario: similitud coseno ~0.98
+        vector = [x + rng.gauss(0, noise / dim ** 0.5) for x in base]
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--duplicates", type=float, default=0.01, help="Fracción de casi-duplicados plantados")
+    parser.add_argument("--threshold", type=float, default=functions.NEAR_DUPLICATE_THRESHOLD)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        functions.configure_vectorstore(
+            persist_directory=tmp, collection_name="bench", embedding_function=DeterministicFakeEmbedding(size=args.dim)
+        )
+        collection = functions.get_vectorstore()._collection
+
+        t0 = time.perf_counter()
+        planted = 0
+        recent = []
+        for start in range(0, args.cards, 1000):
+            ids, vectors, metadatas = [], [], []
+            for i in range(start, min(start + 1000, args.cards)):
+                if recent and rng.random() < args.duplicates:
+                    vectors.append(random_unit_vector(rng, args.dim, base=rng.choice(recent)))
+                    planted += 1
+                else:
+                    vectors.append(random_unit_vector(rng, args.dim))
+                    recent = (recent + [vectors[-1]])[-50:]
+                ids.append(f"card-{i}")
+                metadatas.append({"palabra": f"mot{i}", "traduccion": f"palabra{i}", "ejemplo_fr": "..."})
+            collection.add(ids=ids, embeddings=vectors, metadatas=metadatas, documents=[m["palabra"] for m in metadatas])
+        print(f"Colección con {args.cards} flashcards ({planted} casi-duplicados plantados) en {time.perf_counter() - t0:.1f} s")
+
+        t0 = time.perf_counter()
+        groups = functions.find_duplicate_flashcards(threshold=args.threshold)
+        elapsed = time.perf_counter() - t0
+        print(f"Barrido completo: {elapsed:.2f} s, {len(groups)} grupos, {sum(len(g) for g in groups)} flashcards implicadas")
+
+        functions.close_vectorstore()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: latencia por operación con el almacén compartido vs. abrir Chroma en cada llamada.
+
+Crea una colección temporal de N flashcards con embeddings falsos (sin llamadas a OpenAI)
+y mide get/delete abriendo un cliente nuevo cada vez (comportamiento anterior) frente al
+handle compartido de `functions.get_vectorstore()`.
+
+Uso:
+    python benchmarks/bench_vectorstore_pool.py --cards 10000 --ops 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import functions
+
+
+def seed(vectorstore, n_cards: int, batch_size: int = 1000) -> list:
+    ids = []
+    for start in range(0, n_cards, batch_size):
+        batch = range(start, min(start + batch_size, n_cards))
+        batch_ids = [str(uuid.uuid5(uuid.NAMESPACE_DNS, f"mot{i}")) for i in batch]
+        vectorstore._collection.add(
+            ids=batch_ids,
+            embeddings=[[float(i % 7), float(i % 11), 1.0] + [0.0] * 13 for i in batch],
+            documents=[f"mot{i}\npalabra{i}" for i in batch],
+            metadatas=[{"palabra": f"mot{i}", "traduccion": f"palabra{i}", "ejemplo_fr": "..."} for i in batch],
+        )
+        ids.extend(batch_ids)
+    return ids
+
+
+def timed(fn, n_ops: int) -> list:
+    samples = []
+    for i in range(n_ops):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(name: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<28} mean={statistics.mean(samples):8.2f} ms  p50={statistics.median(samples):8.2f} ms  p95={p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    with tempfile.TemporaryDirectory() as tmp:
+        functions.configure_vectorstore(persist_directory=tmp, collection_name="bench", embedding_function=embeddings)
+        t0 = time.perf_counter()
+        ids = seed(functions.get_vectorstore(), args.cards)
+        print(f"Colección con {len(ids)} flashcards creada en {time.perf_counter() - t0:.1f} s\n")
+
+        def fresh_store():
+            return Chroma(persist_directory=tmp, embedding_function=embeddings, collection_name="bench")
+
+        report("get (cliente nuevo)", timed(lambda i: fresh_store().get(ids=[ids[i]]), args.ops))
+        report("get (compartido)", timed(lambda i: functions.get_vectorstore().get(ids=[ids[i]]), args.ops))
+        report("delete (cliente nuevo)", timed(lambda i: fresh_store().delete(ids=[ids[i]]), args.ops // 2))
+        report("delete (compartido)", timed(lambda i: functions.get_vectorstore().delete(ids=[ids[args.ops // 2 + i]]), args.ops // 2))
+
+        functions.close_vectorstore()
+
+
+if __name__ == "__main__":
+    main()
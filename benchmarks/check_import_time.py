@@ -0,0 +1,106 @@
+"""
+Comprueba que el arranque en frío no empeora: falla (código 1) si importar `functions` tarda
+más que el presupuesto o si carga alguna de las dependencias pesadas que deben importarse
+solo al usarse (LangChain, Chroma, numpy, Pillow).
+
+Cada medición se hace en un proceso nuevo; se toma la mediana de varias ejecuciones y se le
+resta el arranque del intérprete. Con --home mide además el primer render de Home con el
+AppTest de Streamlit.
+
+Uso:
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 300 --home --home-budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "app"))
+
+# Módulos que no deben cargarse al importar functions ni al pintar Home
+HEAVY_MODULES = ("langchain_openai", "langchain_community", "langchain_core", "chromadb", "openai", "numpy", "PIL")
+
+HOME_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.run()
+print(json.dumps({"seconds": time.perf_counter() - t0, "errors": [str(e.value) for e in at.exception]}))
+"""
+
+LOADED_SCRIPT = "import json, sys; import functions; print(json.dumps(sorted(set(m.split('.')[0] for m in sys.modules))))"
+
+
+def run(code: str, cwd: str, env: dict, *args) -> tuple:
+    t0 = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", code, *args], cwd=cwd, env=env, check=True, capture_output=True, text=True)
+    return time.perf_counter() - t0, process.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("FLASHCARDS_IMPORT_BUDGET_MS", "400")),
+                        help="Tiempo máximo para importar functions")
+    parser.add_argument("--home", action="store_true", help="Medir también el primer render de Home")
+    parser.add_argument("--home-budget-ms", type=float, default=float(os.getenv("FLASHCARDS_HOME_BUDGET_MS", "2000")))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-fake"),
+            FLASHCARDS_CHROMA_DIR=os.path.join(tmp, "chroma_db"),
+            FLASHCARDS_DB_PATH=os.path.join(tmp, "flashcards.sqlite"),
+            FLASHCARDS_CACHE_PATH=os.path.join(tmp, "llm_responses.sqlite"),
+            FLASHCARDS_EMBEDDINGS_CACHE_PATH=os.path.join(tmp, "embeddings.sqlite"),
+            PYTHONPATH=os.pathsep.join([APP_DIR, os.environ.get("PYTHONPATH", "")]),
+        )
+        baseline = statistics.median(run("pass", tmp, env)[0] for _ in range(args.runs))
+        import_ms = (statistics.median(run("import functions", tmp, env)[0] for _ in range(args.runs)) - baseline) * 1000
+        status = "✅" if import_ms <= args.budget_ms else "❌"
+        print(f"{status} import functions: {import_ms:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+        if import_ms > args.budget_ms:
+            failures.append("import functions")
+
+        loaded = set(json.loads(run(LOADED_SCRIPT, tmp, env)[1]))
+        heavy = [module for module in HEAVY_MODULES if module in loaded]
+        if heavy:
+            print(f"❌ import functions carga módulos pesados: {', '.join(heavy)}")
+            failures.append("heavy imports")
+        else:
+            print("✅ import functions no carga módulos pesados")
+
+        if args.home:
+            # La primera ejecución calienta los .pyc de Streamlit; se mide la mediana del resto
+            samples = []
+            for _ in range(args.runs + 1):
+                _, output = run(HOME_SCRIPT, tmp, env, os.path.join(APP_DIR, "streamlit_app.py"))
+                home = json.loads(output.strip().splitlines()[-1])
+                if home["errors"]:
+                    print(f"❌ Home falló: {home['errors']}")
+                    failures.append("home errors")
+                    break
+                samples.append(home["seconds"] * 1000)
+            if samples:
+                home_ms = statistics.median(samples[1:] or samples)
+                status = "✅" if home_ms <= args.home_budget_ms else "❌"
+                print(f"{status} primer render de Home: {home_ms:.0f} ms (presupuesto {args.home_budget_ms:.0f} ms)")
+                if home_ms > args.home_budget_ms:
+                    failures.append("home")
+
+    if failures:
+        print(f"Arranque en frío por encima del presupuesto: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Servidor local que imita los endpoints de OpenAI que usa la app (chat y embeddings).
+
+Responde con flashcards sintéticas y vectores deterministas, con una latencia configurable,
+para medir la app sin red ni API key. También puede imitar los límites de uso (429 con
+Retry-After cuando se pasan N peticiones por ventana) y fallos pasajeros (503 al azar).
+Basta con apuntar el cliente a él:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-fake
+
+Uso:
+    python benchmarks/fake_openai.py --port 8765 --latency 0.5 --cards-per-image 8
+    python benchmarks/fake_openai.py --rate-limit 10 --rate-window 1 --error-rate 0.05
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class FakeOpenAI:
+    """
+    Estado y respuestas del servidor falso.
+
+    Args:
+        latency: Segundos de espera antes de cada respuesta de chat (media).
+        jitter: Variación aleatoria (+/-) sobre `latency`.
+        embeddings_latency: Segundos de espera por llamada de embeddings.
+        cards_per_image: Flashcards que "encuentra" cada imagen.
+        dim: Dimensión de los embeddings devueltos.
+        stream_chunk: Caracteres por trozo en las respuestas en streaming.
+        rate_limit: Peticiones (chat y embeddings por separado) admitidas por `rate_window`;
+            las demás reciben 429 con retry-after-ms. 0 = sin límite.
+        rate_window: Segundos de la ventana del límite.
+        error_rate: Fracción de peticiones que fallan con 503.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, embeddings_latency: float = 0.0,
+                 cards_per_image: int = 8, dim: int = 256, stream_chunk: int = 16, rate_limit: int = 0,
+                 rate_window: float = 60.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.embeddings_latency = embeddings_latency
+        self.cards_per_image = cards_per_image
+        self.dim = dim
+        self.stream_chunk = stream_chunk
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._admitted = {"chat": [], "embeddings": []}
+        self.requests = {"chat": 0, "embeddings": 0, "embedded_texts": 0, "rate_limited": 0, "errors": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.requests[key] += amount
+
+    def reject(self, endpoint: str) -> tuple:
+        """
+        Decide si una petición falla: (código HTTP, segundos de retry-after) o None si se atiende.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.error_rate and random.random() < self.error_rate:
+                self.requests["errors"] += 1
+                return 503, None
+            if not self.rate_limit:
+                return None
+            admitted = self._admitted[endpoint]
+            while admitted and admitted[0] <= now - self.rate_window:
+                admitted.pop(0)
+            if len(admitted) >= self.rate_limit:
+                self.requests["rate_limited"] += 1
+                return 429, admitted[0] + self.rate_window - now
+            admitted.append(now)
+            return None
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def flashcards_for(self, messages: list) -> dict:
+        """
+        Devuelve flashcards coherentes con la petición: una por palabra pedida o
+        `cards_per_image` distintas por imagen.
+        """
+        content = messages[-1]["content"]
+        if isinstance(content, list):
+            image = next(part["image_url"]["url"] for part in content if part.get("type") == "image_url")
+            seed = hashlib.sha256(image.encode("utf-8")).hexdigest()[:8]
+            words = [f"mot-{seed}-{i}" for i in range(self.cards_per_image)]
+        elif ":\n" in content:
+            words = [line for line in content.split(":\n", 1)[1].splitlines() if line.strip()]
+        else:
+            words = [content.rsplit(":", 1)[-1].strip()]
+        return {
+            "flashcards": [
+                {"palabra": word, "traduccion": f"traducción de {word}", "ejemplo_fr": f"J'utilise « {word} » dans une phrase."}
+                for word in words
+            ]
+        }
+
+    def embedding(self, text) -> np.ndarray:
+        # Vector unitario pseudoaleatorio y determinista por texto
+        key = text if isinstance(text, str) else json.dumps(text)
+        seed = int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def usage_for(content: str) -> dict:
+    completion = len(content) // 4
+    return {"prompt_tokens": 100, "completion_tokens": completion, "total_tokens": 100 + completion}
+
+
+def make_handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.endswith("/chat/completions"):
+                endpoint, handle = "chat", self._chat
+            elif self.path.endswith("/embeddings"):
+                endpoint, handle = "embeddings", self._embeddings
+            else:
+                self._json({"error": {"message": f"Unknown endpoint {self.path}"}}, status=404)
+                return
+            rejected = fake.reject(endpoint)
+            if rejected is None:
+                handle(request)
+            else:
+                self._error(*rejected)
+
+        def _error(self, status: int, retry_after):
+            # Mismo cuerpo y cabeceras que la API real ante un límite de uso o una caída
+            kind, message = ("rate_limit_exceeded", "Rate limit reached") if status == 429 else ("server_error", "Service unavailable")
+            body = json.dumps({"error": {"message": message, "type": kind, "code": kind}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after is not None:
+                self.send_header("retry-after-ms", str(int(retry_after * 1000)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chat(self, request: dict):
+            fake._count("chat")
+            content = json.dumps(fake.flashcards_for(request["messages"]), ensure_ascii=False)
+            delay = fake._delay()
+            base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model", "fake")}
+            if not request.get("stream"):
+                time.sleep(delay)
+                self._json({
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage_for(content),
+                })
+                return
+
+            # En streaming la latencia se reparte: la mitad hasta el primer trozo y el resto entre trozos
+            pieces = [content[i:i + fake.stream_chunk] for i in range(0, len(content), fake.stream_chunk)]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            time.sleep(delay / 2)
+            for i, piece in enumerate(pieces):
+                # Como la API real, el primer trozo lleva el rol
+                delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(delay / 2 / len(pieces))
+            end = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self.wfile.write(f"data: {json.dumps(end)}\n\n".encode("utf-8"))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                usage = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage_for(content)}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _embeddings(self, request: dict):
+            inputs = request["input"]
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            fake._count("embeddings")
+            fake._count("embedded_texts", len(inputs))
+            time.sleep(fake.embeddings_latency)
+            data = []
+            for i, text in enumerate(inputs):
+                vector = fake.embedding(text)
+                if request.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            self._json({
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "fake"),
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+            })
+
+    return Handler
+
+
+def start_server(port: int = 0, **kwargs):
+    """
+    Arranca el servidor en un hilo y devuelve (server, fake, base_url).
+
+    Con `port=0` se elige un puerto libre.
+    """
+    fake = FakeOpenAI(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos por respuesta de chat")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--embeddings-latency", type=float, default=0.0)
+    parser.add_argument("--cards-per-image", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Peticiones por ventana antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="Segundos de la ventana del límite")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones que fallan con 503")
+    args = parser.parse_args()
+
+    server, _, base_url = start_server(
+        args.port, latency=args.latency, jitter=args.jitter, embeddings_latency=args.embeddings_latency,
+        cards_per_image=args.cards_per_image, dim=args.dim, rate_limit=args.rate_limit,
+        rate_window=args.rate_window, error_rate=args.error_rate,
+    )
+    print(f"Servidor falso de OpenAI en {base_url} (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
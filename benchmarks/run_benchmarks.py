@@ -0,0 +1,373 @@
+"""
+Suite de benchmarks sin conexión: la app completa contra un servidor falso de OpenAI.
+
+Levanta `fake_openai.py` en un puerto local y ejecuta cada grupo de mediciones en un
+proceso aparte (con su propia base de datos temporal), pasando por el mismo código que
+usa la interfaz:
+
+- store: guardar, paginar/buscar (Manage), cargar la sesión de Study y borrar con 1k, 10k y 100k flashcards
+- extraction: imágenes por segundo de `extract_images` con distintas concurrencias y
+  tiempo hasta la primera flashcard en streaming
+- deck: importar un CSV y exportar a JSONL mazos de 1k, 10k y 100k flashcards (deck_io)
+- coldstart: tiempo de importación de `functions` y `streamlit` en un proceso nuevo
+
+Los resultados se guardan en JSON (una métrica por clave) para comparar versiones con --compare.
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --suites store coldstart
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/anterior.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..", "app")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import start_server
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def median_ms(fn, runs: int = 5) -> float:
+    return round(statistics.median(timed(fn)[0] for _ in range(runs)) * 1000, 2)
+
+
+def make_cards(start: int, count: int) -> list:
+    return [
+        {"palabra": f"mot{i:06d}", "traduccion": f"palabra {i}", "ejemplo_fr": f"Voici le mot numéro {i}."}
+        for i in range(start, start + count)
+    ]
+
+
+def use_offline_embeddings(functions):
+    # tiktoken descarga su vocabulario al tokenizar, así que sin red mandamos el texto tal cual
+    from langchain_openai import OpenAIEmbeddings
+    from embeddings import CachedEmbeddings
+
+    functions.configure_vectorstore(embedding_function=CachedEmbeddings(
+        OpenAIEmbeddings(model=functions.EMBEDDINGS_MODEL, chunk_size=functions.EMBEDDINGS_BATCH_SIZE,
+                         check_embedding_ctx_length=False, max_retries=0),
+        model=functions.EMBEDDINGS_MODEL,
+        cache=functions.embeddings_cache,
+        batch_size=functions.EMBEDDINGS_BATCH_SIZE,
+        metrics=functions.metrics,
+        scheduler=functions.embeddings_scheduler,
+    ))
+
+
+# --- Mediciones (se ejecutan en el proceso hijo) ---
+
+def bench_store(size: int, batch_size: int = 1000) -> dict:
+    import functions
+    use_offline_embeddings(functions)
+    results = {}
+
+    elapsed = 0.0
+    for start in range(0, size, batch_size):
+        seconds, _ = timed(functions.save_flashcards_to_db, {"flashcards": make_cards(start, min(batch_size, size - start))})
+        elapsed += seconds
+        if start and start % (10 * batch_size) == 0:
+            print(f"  {start} flashcards guardadas ({start / elapsed:.0f}/s)", file=sys.stderr, flush=True)
+    results["save_bulk_s"] = round(elapsed, 2)
+    results["save_bulk_per_s"] = round(size / elapsed, 1)
+
+    # Guardar una flashcard suelta en un mazo ya grande (lo que hace "Add to my deck")
+    singles = [timed(functions.save_flashcards_to_db, {"flashcards": make_cards(size + i, 1)})[0] for i in range(20)]
+    results["save_one_ms"] = round(statistics.median(singles) * 1000, 2)
+
+    total = functions.count_flashcards()
+    results["count_ms"] = median_ms(functions.count_flashcards)
+    results["manage_first_page_ms"] = median_ms(lambda: functions.get_flashcards_page(limit=50))
+    results["manage_last_page_ms"] = median_ms(lambda: functions.get_flashcards_page(limit=50, offset=max(0, total - 50)))
+    results["manage_prefix_ms"] = median_ms(lambda: functions.get_flashcards_page(limit=50, prefix="mot0001"))
+    # Un texto de la traducción (la búsqueda mira la palabra y la traducción, no el ejemplo) que sale en
+    # muchas flashcards; si no encontrara ninguna se estaría midiendo una búsqueda vacía
+    assert functions.get_flashcards_page(limit=50, contains="palabra 99")["flashcards"], "la búsqueda 'contains' no encuentra flashcards"
+    results["manage_contains_ms"] = median_ms(lambda: functions.get_flashcards_page(limit=50, contains="palabra 99"))
+    results["manage_full_load_ms"] = median_ms(functions.get_all_flashcards, runs=1)
+
+    results["study_load_ms"] = median_ms(functions.get_due_flashcards)
+    results["study_count_due_ms"] = median_ms(functions.count_due_flashcards)
+
+    words = [card["palabra"] for card in random.Random(0).sample(make_cards(0, size), min(50, size))]
+    deletes = [timed(functions.delete_flashcard, word)[0] for word in words]
+    results["delete_ms"] = round(statistics.median(deletes) * 1000, 2)
+
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    functions.close_vectorstore()
+    return results
+
+
+def bench_deck(size: int) -> dict:
+    import csv
+    import functions
+    import deck_io
+    use_offline_embeddings(functions)
+    results = {}
+
+    source = os.path.abspath("deck.csv")
+    with open(source, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["palabra", "traduccion", "ejemplo_fr"])
+        for start in range(0, size, 1000):
+            writer.writerows([card["palabra"], card["traduccion"], card["ejemplo_fr"]] for card in make_cards(start, min(1000, size - start)))
+
+    with open(source, encoding="utf-8", newline="") as f:
+        seconds, summary = timed(deck_io.import_deck, f, "csv")
+    results["import_s"] = round(seconds, 2)
+    results["import_per_s"] = round(size / seconds, 1)
+    results["import_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    with open(os.path.abspath("deck.jsonl"), "w", encoding="utf-8") as f:
+        seconds, count = timed(deck_io.export_deck, f, "jsonl")
+    results["export_s"] = round(seconds, 2)
+    results["export_per_s"] = round(count / seconds, 1)
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    functions.close_vectorstore()
+    return results
+
+
+def synthetic_images(count: int) -> list:
+    from PIL import Image
+
+    rng = random.Random(0)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (1200, 900), (rng.randrange(200, 256),) * 3)
+        image.putpixel((rng.randrange(1200), rng.randrange(900)), (0, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def bench_extraction(images: int, concurrency: list) -> dict:
+    import functions
+    results = {}
+    batch = synthetic_images(images)
+
+    for level in concurrency:
+        seconds, merged = timed(functions.extract_images, batch, max_concurrency=level, use_cache=False)
+        if merged["errors"]:
+            raise RuntimeError(f"La extracción falló: {next(iter(merged['errors'].values()))}")
+        results[f"c{level}_images_per_s"] = round(images / seconds, 2)
+
+    first, totals = [], []
+    for image in batch[:3]:
+        t0 = time.perf_counter()
+        stream = functions.image_to_text_stream(image, use_cache=False)
+        next(stream)
+        first.append(time.perf_counter() - t0)
+        for _ in stream:
+            pass
+        totals.append(time.perf_counter() - t0)
+    results["stream_first_card_ms"] = round(statistics.median(first) * 1000, 1)
+    results["stream_total_ms"] = round(statistics.median(totals) * 1000, 1)
+    return results
+
+
+def bench_coldstart(runs: int = 5) -> dict:
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.abspath(APP_DIR), os.environ.get("PYTHONPATH", "")]))
+
+    def run(code: str, *flags) -> float:
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *flags, "-c", code], cwd=tmp, env=env, check=True, capture_output=True)
+        return time.perf_counter() - t0
+
+    results = {}
+    baseline = statistics.median(run("pass") for _ in range(runs))
+    for module in ("functions", "streamlit"):
+        samples = [run(f"import {module}") for _ in range(runs)]
+        results[f"import_{module}_ms"] = round((statistics.median(samples) - baseline) * 1000, 1)
+
+    # Los módulos que más pesan en la importación de functions (tiempo acumulado)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import functions"], cwd=tmp, env=env, check=True, capture_output=True, text=True
+    )
+    modules = []
+    for line in process.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+            modules.append((int(parts[1]), parts[2].strip()))
+    results["top_imports_ms"] = {name: round(us / 1000, 1) for us, name in sorted(modules, reverse=True)[:10]}
+    shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+# --- Orquestación ---
+
+def run_worker(suite: str, params: dict, base_url: str) -> dict:
+    """
+    Ejecuta una medición en un proceso nuevo con datos temporales propios y devuelve sus métricas.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            OPENAI_BASE_URL=base_url,
+            OPENAI_API_KEY="sk-fake",
+            FLASHCARDS_CHROMA_DIR=os.path.join(tmp, "chroma_db"),
+            FLASHCARDS_DB_PATH=os.path.join(tmp, "flashcards.sqlite"),
+            FLASHCARDS_CACHE_PATH=os.path.join(tmp, "llm_responses.sqlite"),
+            FLASHCARDS_EMBEDDINGS_CACHE_PATH=os.path.join(tmp, "embeddings.sqlite"),
+            PYTHONPATH=os.pathsep.join([os.path.abspath(APP_DIR), os.environ.get("PYTHONPATH", "")]),
+        )
+        output = os.path.join(tmp, "result.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", suite, "--params", json.dumps(params), "--output", output],
+            cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def flatten(prefix: str, metrics: dict) -> dict:
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            continue
+        flat[f"{prefix}.{name}"] = value
+    return flat
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str, tolerance: float):
+    """
+    Imprime la variación de cada métrica frente a un resultado anterior y marca las regresiones.
+
+    Returns:
+        Número de métricas que empeoraron más que `tolerance`
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["metrics"]
+    print(f"\nComparación con {baseline_path} (tolerancia {tolerance:.0%}):")
+    regressions = 0
+    for name, value in current.items():
+        old = baseline.get(name)
+        if not isinstance(old, (int, float)) or not old:
+            continue
+        change = value / old - 1
+        # En las tasas (por segundo) más es mejor; en los tiempos y la memoria, menos
+        worse = -change if name.endswith("_per_s") else change
+        flag = "  ⚠️ regresión" if worse > tolerance else ""
+        regressions += bool(flag)
+        print(f"  {name:45} {old:>10} -> {value:>10} ({change:+.1%}){flag}")
+    print(f"{regressions} regresiones")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suites", nargs="+", default=["store", "deck", "extraction", "coldstart"],
+                        choices=["store", "deck", "extraction", "coldstart"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000], help="Tamaños de mazo para store y deck")
+    parser.add_argument("--images", type=int, default=16, help="Imágenes por prueba de extracción")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos por respuesta de chat del servidor falso")
+    parser.add_argument("--dim", type=int, default=256, help="Dimensión de los embeddings falsos")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto en benchmarks/results/)")
+    parser.add_argument("--compare", help="Resultado anterior contra el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Empeoramiento relativo que cuenta como regresión")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--params", default="{}", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        params = json.loads(args.params)
+        metrics = {"store": bench_store, "deck": bench_deck, "extraction": bench_extraction}[args.worker](**params)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(metrics, f)
+        return
+
+    server, fake, base_url = start_server(latency=args.latency, dim=args.dim)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "latency_s": args.latency,
+            "embedding_dim": args.dim,
+            "images": args.images,
+        },
+        "metrics": {},
+        "details": {},
+    }
+    metrics = report["metrics"]
+
+    if "store" in args.suites:
+        for size in args.sizes:
+            print(f"store: {size} flashcards...", flush=True)
+            result = run_worker("store", {"size": size}, base_url)
+            metrics.update(flatten(f"store.{size}", result))
+            print(f"  guardar {result['save_bulk_per_s']}/s, Manage {result['manage_first_page_ms']} ms, "
+                  f"Study {result['study_load_ms']} ms, borrar {result['delete_ms']} ms")
+
+    if "deck" in args.suites:
+        for size in args.sizes:
+            print(f"deck: {size} flashcards...", flush=True)
+            result = run_worker("deck", {"size": size}, base_url)
+            metrics.update(flatten(f"deck.{size}", result))
+            print(f"  importar {result['import_per_s']}/s, exportar {result['export_per_s']}/s, memoria {result['peak_rss_mb']} MB")
+
+    if "extraction" in args.suites:
+        print(f"extraction: {args.images} imágenes, latencia {args.latency} s...", flush=True)
+        result = run_worker("extraction", {"images": args.images, "concurrency": args.concurrency}, base_url)
+        metrics.update(flatten("extraction", result))
+        print("  " + ", ".join(f"c={c}: {result[f'c{c}_images_per_s']} img/s" for c in args.concurrency)
+              + f", primera flashcard {result['stream_first_card_ms']} ms")
+
+    if "coldstart" in args.suites:
+        print("coldstart...", flush=True)
+        result = bench_coldstart()
+        metrics.update(flatten("coldstart", result))
+        report["details"]["top_imports_ms"] = result["top_imports_ms"]
+        print(f"  import functions {result['import_functions_ms']} ms, import streamlit {result['import_streamlit_ms']} ms")
+
+    report["meta"]["fake_requests"] = dict(fake.requests)
+    server.shutdown()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {output}")
+
+    # Con regresiones el proceso termina con error, para que un CI pueda pararse ahí
+    if args.compare and compare(metrics, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()